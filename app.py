@@ -1,20 +1,285 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+import json
 from real_music_service import RealMusicService
 import os
+import threading
+import uuid
 from dotenv import load_dotenv
+from intents import split_intents
+from artist_index import ArtistIndex
+from cache import TTLCache
+from jobs import JobQueue, JobQueueFull
+from fields import FieldsError, parse_fields, select_fields
+from profiling import Profiler, thread_pool
+
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSocket chat is optional; POST /chat works without it
+    Sock = None
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
+# WebSocket connections are pinged so idle chats survive proxies; messages are small
+app.config['SOCK_SERVER_OPTIONS'] = {
+    'ping_interval': float(os.getenv('CHAT_WS_PING_INTERVAL', '25')),
+    'max_message_size': int(os.getenv('CHAT_WS_MAX_MESSAGE_SIZE', '16384'))
+}
+sock = Sock(app) if Sock else None
+
+# Opt-in request profiling (PROFILE_SAMPLE_RATE / PROFILE_TOKEN); installs nothing when off
+profiler = Profiler()
+profiler.init_app(app)
 
 # Initialize the real music service with Spotify and OpenAI APIs
 music_service = RealMusicService()
 
+# API-only profile (default): the app serves Spotify/OpenAI features and never
+# imports torch or transformers. Set API_ONLY=false to answer general chat with
+# the local conversation model, loaded in-process on first use or reached
+# through model workers (CHAT_MODEL_WORKER).
+API_ONLY = os.getenv('API_ONLY', 'true').lower() in ('1', 'true', 'yes')
+_chatbot = None
+_chatbot_lock = threading.Lock()
+
+def get_chatbot():
+    """Local conversation chatbot, created on the first general chat message"""
+    global _chatbot
+    if _chatbot is None:
+        with _chatbot_lock:
+            if _chatbot is None:
+                from music_chatbot import MusicChatbot
+                _chatbot = MusicChatbot()
+    return _chatbot
+
+def requested_fields():
+    """Field selector from the ``fields=`` parameter of data endpoints (None = all fields)"""
+    return parse_fields(request.args.get('fields'))
+
+@app.errorhandler(FieldsError)
+def invalid_fields(e):
+    return jsonify({'error': f'Invalid fields parameter: {e}', 'status': 'error'}), 400
+
+# Rendered trending lists, kept until the chart behind them is refetched
+trending_fragments = TTLCache(maxsize=100, ttl=24 * 3600)
+TRENDING_PAGE_MAX_AGE = int(os.getenv('TRENDING_PAGE_MAX_AGE', '60'))
+# Largest /trending limit; every 100 songs is another Spotify page request
+TRENDING_MAX_LIMIT = int(os.getenv('TRENDING_MAX_LIMIT', '500'))
+
+def trending_fragment(limit=5, country='US'):
+    """(data version, HTML) of the trending list, re-rendered only when the chart changes"""
+    version, songs = music_service.cached_trending_songs(limit=limit, country=country)
+    key = (ArtistIndex.normalize(country), limit)
+    cached = trending_fragments.get(key)
+    if cached and cached[0] == version:
+        return cached
+    fragment = (version, render_template('trending_songs.html', songs=songs))
+    trending_fragments.set(key, fragment)
+    return fragment
+
+def cached_page(body):
+    """HTML response browsers may reuse briefly and then revalidate by ETag"""
+    response = app.make_response(body)
+    response.cache_control.public = True
+    response.cache_control.max_age = TRENDING_PAGE_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
-    """Main page"""
-    return render_template('index.html')
+    """Main page, with the trending list rendered in"""
+    try:
+        _, fragment = trending_fragment()
+    except Exception as e:
+        # The page script loads the list itself if it isn't rendered
+        print(f"⚠️ Could not render trending list: {e}")
+        fragment = ''
+    return cached_page(render_template(
+        'index.html',
+        trending_fragment=fragment,
+        # 0 disables the periodic refresh instead of polling in a tight loop
+        trending_refresh_ms=max(TRENDING_PAGE_MAX_AGE, 5) * 1000 if TRENDING_PAGE_MAX_AGE > 0 else 0,
+        chat_websocket=sock is not None
+    ))
+
+@app.route('/trending/fragment')
+def trending_list_fragment():
+    """Rendered trending list for refreshing the main page in place"""
+    try:
+        limit = max(1, min(request.args.get('limit', 5, type=int), 50))
+        country = request.args.get('country', 'US')
+        _, fragment = trending_fragment(limit=limit, country=country)
+        return cached_page(fragment)
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+WELCOME_MESSAGE = """🎵 Welcome to the AI Music Chatbot! I can help you with:
+
+• "What's trending?" - Get current popular songs
+• "Search for [song name]" - Find specific songs  
+• "Generate lyrics for [song] by [artist]" - AI-generated original lyrics
+• "Tell me about [artist]" - Get artist information
+
+What would you like to explore today?"""
+
+# Sub-requests of a multi-intent chat message run concurrently on this pool
+chat_executor = thread_pool(
+    max_workers=int(os.getenv('CHAT_DISPATCH_WORKERS', '8')),
+    thread_name_prefix='chat'
+)
+
+def detect_chat_intent(text):
+    """Return the intent of a lower-cased chat message (or clause), if any"""
+    if 'trending' in text or 'popular' in text:
+        return 'trending'
+    elif 'lyrics' in text:
+        return 'lyrics'
+    elif any(word in text for word in ['search', 'find', 'look for']):
+        return 'search'
+    elif 'artist' in text or 'about' in text:
+        return 'artist'
+    return None
+
+def trending_reply(limit=5, country='US'):
+    trending = music_service.get_trending_songs(limit=limit, country=country)
+    if trending:
+        song_list = "\n".join([f"{song['rank']}. {song['title']} by {song['artist']}" for song in trending[:limit]])
+        # Follow-ups usually ask about one of the listed artists; warm them in the background
+        music_service.prefetch_artists(trending[:limit])
+        return f"🎵 Here are the current trending songs:\n\n{song_list}"
+    return "Sorry, I couldn't fetch trending songs right now. Please try again later."
+
+def lyrics_reply(user_input):
+    # Extract song and artist from query if possible
+    user_lower = user_input.lower()
+    words = user_input.split()
+    if len(words) > 2:
+        # Simple extraction - look for patterns like "lyrics for Song by Artist"
+        try:
+            if 'by' in user_lower:
+                parts = user_input.split(' by ')
+                song_part = parts[0].replace('lyrics for', '').replace('lyrics', '').strip()
+                artist_part = parts[1].strip()
+            else:
+                song_part = ' '.join(words[1:3])  # Take next 2 words as song title
+                artist_part = "Unknown Artist"
+            
+            lyrics_data = music_service.generate_ai_lyrics(song_part, artist_part)
+            return f"🎤 AI-Generated Lyrics for '{lyrics_data['title']}':\n\n{lyrics_data['lyrics'][:500]}...\n\n💡 {lyrics_data['note']}"
+        except:
+            pass
+    return "Please specify a song title for AI-generated lyrics. Example: 'Generate lyrics for My Song by Artist Name'"
+
+def extract_search_terms(user_input):
+    search_terms = user_input.lower()
+    for remove_word in ['search for', 'find', 'look for', 'search']:
+        search_terms = search_terms.replace(remove_word, '').strip()
+    return search_terms
+
+def search_reply(search_terms, limit=3):
+    if search_terms:
+        results = music_service.search_song(search_terms, limit=limit)
+        if results:
+            song_list = "\n".join([f"• {song['title']} by {song['artist']} ({song['album']})" for song in results])
+            music_service.prefetch_artists(results)
+            return f"🔍 Found these songs for '{search_terms}':\n\n{song_list}"
+        return f"No songs found for '{search_terms}'. Try a different search term."
+    return "Please specify what you'd like to search for."
+
+def extract_artist_name(user_input):
+    words = user_input.split()
+    for i, word in enumerate(words):
+        if word.lower() in ['artist', 'about']:
+            if i + 1 < len(words):
+                return ' '.join(words[i+1:])
+    return None
+
+def artist_reply(artist_name):
+    if artist_name:
+        artist_info = music_service.get_artist_info(artist_name)
+        if artist_info:
+            return f"🎤 {artist_info['name']}\n\nFollowers: {artist_info.get('followers', 'N/A'):,}\nGenres: {', '.join(artist_info.get('genres', ['Unknown']))}\nPopularity: {artist_info.get('popularity', 'N/A')}/100"
+        return f"Sorry, I couldn't find information about artist '{artist_name}'"
+    return "Please specify an artist name. Example: 'Tell me about Taylor Swift'"
+
+def parse_chat_request(intent, user_input):
+    """Return (reply cache key, data lookup, reply function, arguments) for a chat request.
+    
+    The cache key is the intent with its normalized entities and parameters, so
+    "Tell me about Taylor Swift!" and "tell me about taylor swift" share a reply.
+    The data lookup is the (kind, query) whose version invalidates that reply.
+    """
+    if intent == 'trending':
+        limit, country = 5, 'US'
+        return ('trending', country, limit), ('trending', country), trending_reply, (limit, country)
+    if intent == 'search':
+        search_terms = extract_search_terms(user_input)
+        return ('search', ArtistIndex.normalize(search_terms), 3), ('search', search_terms), search_reply, (search_terms, 3)
+    if intent == 'artist':
+        artist_name = extract_artist_name(user_input)
+        return ('artist', ArtistIndex.normalize(artist_name or '')), ('artist', artist_name or ''), artist_reply, (artist_name,)
+    # Generated lyrics are never reused verbatim here; the AI similarity cache covers repeats
+    return None, None, lyrics_reply, (user_input,)
+
+# Formatted replies to common chat requests, reused while their data is unchanged
+reply_cache = TTLCache(
+    maxsize=int(os.getenv('CHAT_REPLY_CACHE_SIZE', '2000')),
+    ttl=float(os.getenv('CHAT_REPLY_CACHE_TTL', '60'))
+)
+
+def chat_reply(intent, user_input):
+    """Answer one music request, from the reply cache when its data hasn't been refetched"""
+    key, lookup, reply, args = parse_chat_request(intent, user_input)
+    if key is None:
+        return reply(*args)
+    
+    cached = reply_cache.get(key)
+    if cached and cached[0] == music_service.data_version(*lookup):
+        return cached[1]
+    
+    response = reply(*args)
+    # Building the reply may itself have refetched the data, so read the version afterwards
+    version = music_service.data_version(*lookup)
+    # Version 0: built from mock or fallback data, which must not outlive an outage
+    if version:
+        reply_cache.set(key, (version, response))
+    return response
+
+def chat_replies(user_input, session_id, stream=False):
+    """Yield the reply to a chat message in parts, as soon as each is ready.
+    
+    Each request of a multi-intent message is one part, in message order
+    (parts after the first start with a blank line). General chat with the
+    local model is yielded token by token when ``stream`` is set.
+    """
+    # A message may carry several requests ("what's trending and tell me about Dua Lipa")
+    requests_in_message = split_intents(user_input, detect_chat_intent)
+    
+    if len(requests_in_message) > 1:
+        # Dispatch every sub-request at once; latency is that of the slowest one
+        futures = [
+            chat_executor.submit(chat_reply, intent, clause)
+            for intent, clause in requests_in_message
+        ]
+        for i, future in enumerate(futures):
+            yield ("\n\n" if i else "") + future.result()
+    
+    elif requests_in_message[0][0]:
+        yield chat_reply(requests_in_message[0][0], user_input)
+    
+    elif not API_ONLY:
+        if stream:
+            yield from get_chatbot().chat_stream(user_input, session_id=session_id)
+        else:
+            yield get_chatbot().chat(user_input, session_id=session_id)
+    
+    else:
+        yield WELCOME_MESSAGE
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -25,85 +290,13 @@ def chat():
         if not user_input:
             return jsonify({'error': 'No message provided'}), 400
         
-        # Process different types of queries
-        user_lower = user_input.lower()
-        
-        if 'trending' in user_lower or 'popular' in user_lower:
-            trending = music_service.get_trending_songs(limit=5)
-            if trending:
-                song_list = "\n".join([f"{song['rank']}. {song['title']} by {song['artist']}" for song in trending[:5]])
-                response = f"🎵 Here are the current trending songs:\n\n{song_list}"
-            else:
-                response = "Sorry, I couldn't fetch trending songs right now. Please try again later."
-        
-        elif 'lyrics' in user_lower:
-            # Extract song and artist from query if possible
-            words = user_input.split()
-            if len(words) > 2:
-                # Simple extraction - look for patterns like "lyrics for Song by Artist"
-                try:
-                    if 'by' in user_lower:
-                        parts = user_input.split(' by ')
-                        song_part = parts[0].replace('lyrics for', '').replace('lyrics', '').strip()
-                        artist_part = parts[1].strip()
-                    else:
-                        song_part = ' '.join(words[1:3])  # Take next 2 words as song title
-                        artist_part = "Unknown Artist"
-                    
-                    lyrics_data = music_service.generate_ai_lyrics(song_part, artist_part)
-                    response = f"🎤 AI-Generated Lyrics for '{lyrics_data['title']}':\n\n{lyrics_data['lyrics'][:500]}...\n\n💡 {lyrics_data['note']}"
-                except:
-                    response = "Please specify a song title for AI-generated lyrics. Example: 'Generate lyrics for My Song by Artist Name'"
-            else:
-                response = "Please specify a song title for AI-generated lyrics. Example: 'Generate lyrics for My Song by Artist Name'"
-        
-        elif any(word in user_lower for word in ['search', 'find', 'look for']):
-            # Extract search query
-            search_terms = user_input.lower()
-            for remove_word in ['search for', 'find', 'look for', 'search']:
-                search_terms = search_terms.replace(remove_word, '').strip()
-            
-            if search_terms:
-                results = music_service.search_song(search_terms, limit=3)
-                if results:
-                    song_list = "\n".join([f"• {song['title']} by {song['artist']} ({song['album']})" for song in results])
-                    response = f"🔍 Found these songs for '{search_terms}':\n\n{song_list}"
-                else:
-                    response = f"No songs found for '{search_terms}'. Try a different search term."
-            else:
-                response = "Please specify what you'd like to search for."
-        
-        elif 'artist' in user_lower or 'about' in user_lower:
-            # Extract artist name
-            words = user_input.split()
-            artist_name = None
-            for i, word in enumerate(words):
-                if word.lower() in ['artist', 'about']:
-                    if i + 1 < len(words):
-                        artist_name = ' '.join(words[i+1:])
-                        break
-            
-            if artist_name:
-                artist_info = music_service.get_artist_info(artist_name)
-                if artist_info:
-                    response = f"🎤 {artist_info['name']}\n\nFollowers: {artist_info.get('followers', 'N/A'):,}\nGenres: {', '.join(artist_info.get('genres', ['Unknown']))}\nPopularity: {artist_info.get('popularity', 'N/A')}/100"
-                else:
-                    response = f"Sorry, I couldn't find information about artist '{artist_name}'"
-            else:
-                response = "Please specify an artist name. Example: 'Tell me about Taylor Swift'"
-        
-        else:
-            response = """🎵 Welcome to the AI Music Chatbot! I can help you with:
-
-• "What's trending?" - Get current popular songs
-• "Search for [song name]" - Find specific songs  
-• "Generate lyrics for [song] by [artist]" - AI-generated original lyrics
-• "Tell me about [artist]" - Get artist information
-
-What would you like to explore today?"""
+        # Clients without a session get their own, never a shared conversation memory
+        session_id = request.json.get('session_id') or uuid.uuid4().hex
+        response = ''.join(chat_replies(user_input, session_id))
         
         return jsonify({
             'response': response,
+            'session_id': session_id,
             'status': 'success'
         })
     
@@ -113,17 +306,63 @@ What would you like to explore today?"""
             'status': 'error'
         }), 500
 
+def chat_socket(ws):
+    """Chat over one WebSocket per browser session, streaming each reply in parts.
+    
+    The client sends {"message": ..., "id": ...}; the server answers with
+    "chunk" events carrying reply text as it is ready, then "done" (or
+    "error") with the same id. The session ID (``?session_id=``, or a new one
+    announced in the "ready" event) keys the conversation memory.
+    """
+    session_id = request.args.get('session_id') or uuid.uuid4().hex
+    ws.send(json.dumps({'type': 'ready', 'session_id': session_id}))
+    
+    while True:
+        try:
+            data = json.loads(ws.receive())
+            message_id = data.get('id')
+            user_input = str(data.get('message') or '').strip()
+        except (TypeError, ValueError, AttributeError):
+            ws.send(json.dumps({'type': 'error', 'error': 'Expected a JSON object with a message'}))
+            continue
+        
+        if not user_input:
+            ws.send(json.dumps({'type': 'error', 'id': message_id, 'error': 'No message provided'}))
+            continue
+        
+        try:
+            for chunk in chat_replies(user_input, session_id, stream=True):
+                ws.send(json.dumps({'type': 'chunk', 'id': message_id, 'text': chunk}))
+            ws.send(json.dumps({'type': 'done', 'id': message_id}))
+        except Exception as e:
+            # Sending fails again if the socket was closed, which ends the connection
+            ws.send(json.dumps({'type': 'error', 'id': message_id, 'error': str(e)}))
+
+if sock:
+    sock.route('/ws/chat')(chat_socket)
+
 @app.route('/trending')
 def trending():
     """Get trending songs"""
+    fields = requested_fields()
     try:
-        limit = request.args.get('limit', 10, type=int)
+        limit = max(1, min(request.args.get('limit', 10, type=int), TRENDING_MAX_LIMIT))
         country = request.args.get('country', 'US')
+        # Only the selected song fields are requested from Spotify
+        song_fields = list(fields) if fields else None
+        
+        if request.args.get('stream', type=int):
+            # Stream songs as newline-delimited JSON while pages arrive
+            songs = music_service.iter_trending_songs(limit=limit, country=country, fields=song_fields)
+            return Response(
+                stream_with_context(json.dumps(select_fields(song, fields)) + '\n' for song in songs),
+                mimetype='application/x-ndjson'
+            )
         
-        trending_songs = music_service.get_trending_songs(limit=limit, country=country)
+        trending_songs = music_service.get_trending_songs(limit=limit, country=country, fields=song_fields)
         
         return jsonify({
-            'songs': trending_songs,
+            'songs': select_fields(trending_songs, fields),
             'status': 'success',
             'count': len(trending_songs)
         })
@@ -137,12 +376,13 @@ def trending():
 @app.route('/artist/<artist_name>')
 def artist_info(artist_name):
     """Get artist information"""
+    fields = requested_fields()
     try:
         artist_data = music_service.get_artist_info(artist_name)
         
         if artist_data and artist_data.get('name'):
             return jsonify({
-                'artist': artist_data,
+                'artist': select_fields(artist_data, fields),
                 'status': 'success'
             })
         else:
@@ -157,9 +397,43 @@ def artist_info(artist_name):
             'status': 'error'
         }), 500
 
+@app.route('/artists', methods=['GET', 'POST'])
+def artists_info():
+    """Get information for many artists in one request"""
+    fields = requested_fields()
+    try:
+        if request.method == 'POST':
+            payload = request.get_json(silent=True) or {}
+            names = payload.get('names', []) if isinstance(payload, dict) else None
+            ids = payload.get('ids', []) if isinstance(payload, dict) else None
+            if not all(isinstance(values, list) and all(isinstance(v, str) for v in values)
+                       for values in (names, ids)):
+                return jsonify({'error': 'names and ids must be lists of strings', 'status': 'error'}), 400
+        else:
+            names = [name.strip() for name in request.args.get('names', '').split(',') if name.strip()]
+            ids = [artist_id.strip() for artist_id in request.args.get('ids', '').split(',') if artist_id.strip()]
+        
+        if not names and not ids:
+            return jsonify({'error': 'Provide artist names or ids'}), 400
+        
+        artists = music_service.get_artists_info(artist_names=names, artist_ids=ids)
+        
+        return jsonify({
+            'artists': select_fields(artists, fields),
+            'status': 'success',
+            'count': len(artists)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
 @app.route('/lyrics')
 def lyrics():
     """Get AI-generated song lyrics"""
+    fields = requested_fields()
     try:
         song = request.args.get('song', '')
         artist = request.args.get('artist', '')
@@ -175,7 +449,7 @@ def lyrics():
         lyrics_data = music_service.generate_ai_lyrics(song, artist, style)
         
         return jsonify({
-            'lyrics': lyrics_data,
+            'lyrics': select_fields(lyrics_data, fields),
             'status': 'success'
         })
     
@@ -188,6 +462,7 @@ def lyrics():
 @app.route('/search')
 def search():
     """Search for songs"""
+    fields = requested_fields()
     try:
         query = request.args.get('q', '')
         limit = request.args.get('limit', 5, type=int)
@@ -197,9 +472,10 @@ def search():
         
         # Search using Spotify API
         results = music_service.search_song(query, limit=limit)
+        music_service.prefetch_artists(results)
         
         return jsonify({
-            'songs': results,
+            'songs': select_fields(results, fields),
             'status': 'success',
             'query': query,
             'count': len(results)
@@ -211,9 +487,95 @@ def search():
             'status': 'error'
         }), 500
 
+@app.route('/trending/history')
+def trending_history():
+    """Daily trending charts from recorded snapshots"""
+    fields = requested_fields()
+    try:
+        country = request.args.get('country', 'US')
+        days = max(1, min(request.args.get('days', 30, type=int), 366))
+        limit = request.args.get('limit', 10, type=int)
+        query = request.args.get('q')
+        
+        history = music_service.trending_history.history(country=country, days=days, limit=limit, query=query)
+        
+        return jsonify({
+            'history': [{**day, 'songs': select_fields(day['songs'], fields)} for day in history],
+            'country': country,
+            'days': len(history),
+            'status': 'success'
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/trending/movers')
+def trending_movers():
+    """Rank changes, new entries, drop-outs and streaks between daily charts"""
+    fields = requested_fields()
+    try:
+        country = request.args.get('country', 'US')
+        days = max(request.args.get('days', 1, type=int), 1)
+        limit = request.args.get('limit', 10, type=int)
+        
+        movers = music_service.trending_history.movers(country=country, days=days, limit=limit)
+        if movers is None:
+            return jsonify({'error': 'No trending history recorded yet', 'status': 'error'}), 404
+        
+        return jsonify({
+            **{key: select_fields(value, fields) if isinstance(value, list) else value
+               for key, value in movers.items()},
+            'status': 'success'
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/recommend')
+def recommend():
+    """Recommend tracks similar to one or more seed tracks or artists"""
+    fields = requested_fields()
+    try:
+        seeds = [seed.strip() for seed in request.args.getlist('seed') if seed.strip()]
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        
+        if not seeds:
+            return jsonify({'error': 'seed parameter is required'}), 400
+        
+        recommendations, unknown = music_service.recommend(seeds, limit=limit)
+        if len(unknown) == len(seeds):
+            return jsonify({
+                'error': 'No known tracks or artists for the given seeds yet',
+                'unknown_seeds': unknown,
+                'status': 'error'
+            }), 404
+        
+        return jsonify({
+            'seeds': seeds,
+            'recommendations': select_fields(recommendations, fields),
+            'unknown_seeds': unknown,
+            'count': len(recommendations),
+            'status': 'success'
+        })
+    
+    except ImportError:
+        return jsonify({'error': 'Recommendations require numpy', 'status': 'error'}), 503
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
 @app.route('/analysis')
 def analysis():
     """Get AI-powered song analysis"""
+    fields = requested_fields()
     try:
         song = request.args.get('song', '')
         artist = request.args.get('artist', '')
@@ -225,14 +587,40 @@ def analysis():
             artist = 'Unknown Artist'
         
         # Get AI analysis using OpenAI
-        analysis_text = music_service.get_song_analysis(song, artist)
+        return jsonify({
+            'analysis': select_fields(analysis_result(song, artist), fields),
+            'status': 'success'
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/song/insights')
+def song_insights():
+    """Get AI lyrics and analysis for a song from one OpenAI call"""
+    fields = requested_fields()
+    try:
+        song = request.args.get('song', '')
+        artist = request.args.get('artist', '') or 'Unknown Artist'
+        style = request.args.get('style', 'pop')
+        
+        if not song:
+            return jsonify({'error': 'Song parameter is required'}), 400
+        
+        insights = music_service.get_song_insights(song, artist, style)
         
         return jsonify({
-            'analysis': {
-                'song': song,
-                'artist': artist,
-                'text': analysis_text
-            },
+            **select_fields({
+                'lyrics': insights['lyrics'],
+                'analysis': {
+                    'song': song,
+                    'artist': artist,
+                    'text': insights['analysis']
+                }
+            }, fields),
             'status': 'success'
         })
     
@@ -242,6 +630,136 @@ def analysis():
             'status': 'error'
         }), 500
 
+def analysis_result(song, artist):
+    return {
+        'song': song,
+        'artist': artist,
+        'text': music_service.get_song_analysis(song, artist)
+    }
+
+# Long-running OpenAI generations can run as background jobs instead of holding a request thread
+job_queue = JobQueue(
+    workers=int(os.getenv('JOBS_WORKERS', '4')),
+    max_queued=int(os.getenv('JOBS_MAX_QUEUED', '100')),
+    result_ttl=float(os.getenv('JOBS_RESULT_TTL', '600'))
+)
+
+def job_response(job):
+    return jsonify({
+        **job.to_dict(),
+        'status_url': f"/jobs/{job.id}",
+        'events_url': f"/jobs/{job.id}/events"
+    }), 202
+
+@app.route('/jobs/lyrics', methods=['POST'])
+def lyrics_job():
+    """Queue AI lyrics generation and return a job ID immediately"""
+    try:
+        data = request.get_json(silent=True) or {}
+        song = data.get('song', '')
+        artist = data.get('artist') or 'Unknown Artist'
+        style = data.get('style', 'pop')
+        
+        if not song:
+            return jsonify({'error': 'Song parameter is required'}), 400
+        
+        key = (ArtistIndex.normalize(song), ArtistIndex.normalize(artist), style)
+        return job_response(job_queue.submit('lyrics', key, music_service.generate_ai_lyrics, song, artist, style))
+    
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'status': 'busy'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/jobs/analysis', methods=['POST'])
+def analysis_job():
+    """Queue AI song analysis and return a job ID immediately"""
+    try:
+        data = request.get_json(silent=True) or {}
+        song = data.get('song', '')
+        artist = data.get('artist') or 'Unknown Artist'
+        
+        if not song:
+            return jsonify({'error': 'Song parameter is required'}), 400
+        
+        key = (ArtistIndex.normalize(song), ArtistIndex.normalize(artist))
+        return job_response(job_queue.submit('analysis', key, analysis_result, song, artist))
+    
+    except JobQueueFull as e:
+        return jsonify({'error': str(e), 'status': 'busy'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll a job; the result is included once it is done"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown or expired job', 'status': 'error'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events: the job's current status, then its outcome when it finishes"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown or expired job', 'status': 'error'}), 404
+    
+    def generate():
+        yield f"event: status\ndata: {json.dumps({'job_id': job.id, 'status': job.status})}\n\n"
+        # Comment lines keep proxies from closing an idle stream
+        while not job.done.wait(timeout=15):
+            yield ": keep-alive\n\n"
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def profile_access_denied():
+    """403 response unless the request carries the profile token in the X-Profile header"""
+    # Header only: query strings end up in access logs
+    if not profiler.authorized(request.headers.get(Profiler.HEADER, '')):
+        return jsonify({'error': 'Profile token required', 'status': 'error'}), 403
+    return None
+
+def debug_profiles():
+    """Recent profile captures, newest first"""
+    denied = profile_access_denied()
+    if denied:
+        return denied
+    profiles = profiler.recent(limit=min(request.args.get('limit', 50, type=int), 500))
+    return jsonify({
+        'profiles': [
+            {**profile, 'url': f"/debug/profiles/{profile['id']}", 'folded_url': f"/debug/profiles/{profile['id']}?format=folded"}
+            for profile in profiles
+        ],
+        'count': len(profiles),
+        'status': 'success'
+    })
+
+def debug_profile(profile_id):
+    """One capture: JSON summary with spans, or ?format=folded for flamegraph stacks"""
+    denied = profile_access_denied()
+    if denied:
+        return denied
+    folded = request.args.get('format') == 'folded'
+    path = profiler.path(profile_id, '.folded' if folded else '.json')
+    if not path:
+        return jsonify({'error': f'Profile {profile_id} not found', 'status': 'error'}), 404
+    with open(path, 'r', encoding='utf-8') as f:
+        return Response(f.read(), mimetype='text/plain' if folded else 'application/json')
+
+# Captures expose paths, stacks and upstream timings, so they are only served behind a token
+if profiler.token:
+    app.route('/debug/profiles')(debug_profiles)
+    app.route('/debug/profiles/<profile_id>')(debug_profile)
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
@@ -259,20 +777,40 @@ def health():
         'apis': {
             'spotify': music_service.spotify is not None,
             'openai': music_service.openai_client is not None
-        }
+        },
+        'profile': 'api-only' if API_ONLY else 'full',
+        'jobs': job_queue.stats(),
+        'openai_usage': music_service.openai_usage.stats()
     })
 
+@app.route('/metrics')
+def metrics():
+    """OpenAI token usage, spend and budget state in Prometheus text format"""
+    return Response(music_service.openai_usage.prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     print("🎵 Starting AI Music Chatbot Web Server...")
     print("📱 Open your browser to: http://localhost:3000")
     print("🔗 API endpoints available:")
     print("   - GET  /health      - Health check with API status")
+    print("   - GET  /metrics     - OpenAI token usage and spend (Prometheus)")
+    if profiler.token:
+        print("   - GET  /debug/profiles - Recent request profiles (X-Profile header or sampling)")
     print("   - POST /chat        - AI-powered chat interface")
+    if sock:
+        print("   - WS   /ws/chat     - Chat over a WebSocket with streamed replies")
     print("   - GET  /trending    - Real trending songs from Spotify")
+    print("   - GET  /trending/fragment - Rendered trending list (cached until the chart changes)")
     print("   - GET  /search      - Search songs via Spotify API")
     print("   - GET  /lyrics      - AI-generated lyrics via OpenAI")
     print("   - GET  /analysis    - AI song analysis via OpenAI")
+    print("   - GET  /song/insights - Lyrics and analysis from one OpenAI call")
     print("   - GET  /artist/<n>  - Real artist info from Spotify")
+    print("   - GET  /artists     - Bulk artist info (?names=a,b or ?ids=x,y)")
+    print("   - GET  /recommend   - Similar tracks (?seed=<track or artist>)")
+    print("   - POST /jobs/lyrics | /jobs/analysis - Queue AI generation, poll /jobs/<id>")
+    print("   - GET  /trending/history - Daily charts from recorded snapshots")
+    print("   - GET  /trending/movers  - Rank changes, new entries and streaks")
     print("🤖 AI Features:")
     print("   - Spotify: Real-time music data")
     print("   - OpenAI: AI-generated lyrics & analysis")
@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+
+class ArtistIndex:
+    """Persistent artist-name to Spotify-ID index with trigram fuzzy matching"""
+
+    def __init__(self, path=None, fuzzy_threshold=None, autosave_interval=30):
+        self.path = path or os.getenv('ARTIST_INDEX_PATH', 'data/artist_index.json')
+        self.fuzzy_threshold = (
+            fuzzy_threshold if fuzzy_threshold is not None
+            else float(os.getenv('ARTIST_INDEX_FUZZY_THRESHOLD', '0.75'))
+        )
+        self.autosave_interval = autosave_interval
+        self._ids = {}
+        self._trigrams = defaultdict(set)
+        # Trigram count of every indexed key, so scoring needn't rebuild their sets
+        self._trigram_counts = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._load()
+
+    @staticmethod
+    def normalize(name):
+        """Normalize Unicode, accents, case, punctuation and whitespace"""
+        name = unicodedata.normalize('NFKD', name)
+        name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+        name = name.casefold()
+        name = re.sub(r'[^\w&+$]+', ' ', name)
+        return ' '.join(name.split())
+
+    @staticmethod
+    def _trigrams_of(key):
+        """Character trigrams of a normalized key, padded at word edges"""
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    @staticmethod
+    def _numbers_of(key):
+        """Numeric tokens of a normalized key, which fuzzy matches must preserve"""
+        return re.findall(r'\d+', key)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, name, artist_id):
+        """Record a name (or alias) for a Spotify artist ID"""
+        key = self.normalize(name)
+        if not key or not artist_id:
+            return
+
+        with self._lock:
+            if self._ids.get(key) == artist_id:
+                return
+            self._index(key, artist_id)
+            self._dirty = True
+
+        if time.monotonic() - self._last_save >= self.autosave_interval:
+            self.save()
+
+    def lookup(self, name, fuzzy=True):
+        """Return the Spotify ID for a name, falling back to the closest fuzzy match"""
+        artist_id, exact = self.match(name)
+        return artist_id if exact or fuzzy else None
+
+    def match(self, name):
+        """(Spotify ID, exact) for a name; exact is False for a fuzzy match, which
+        callers should confirm with close_names() against the artist's real name"""
+        key = self.normalize(name)
+        if not key:
+            return None, False
+
+        with self._lock:
+            if key in self._ids:
+                return self._ids[key], True
+            match = self._best_match(key)
+            return (self._ids[match], False) if match else (None, False)
+
+    @classmethod
+    def close_names(cls, query, name):
+        """Whether a query is plausibly a misspelling of an artist's name.
+
+        Stricter than the trigram threshold: the word count and numbers must
+        agree, a name extended or cut short ("Drakeo" / "Drake") is a different
+        artist, and only about one edit per six characters is allowed.
+        """
+        query, name = cls.normalize(query), cls.normalize(name)
+        if query == name:
+            return True
+        if len(query.split()) != len(name.split()) or cls._numbers_of(query) != cls._numbers_of(name):
+            return False
+        if query.startswith(name) or name.startswith(query):
+            return False
+        return cls._edit_distance(query, name) <= max(1, len(name) // 6)
+
+    @staticmethod
+    def _edit_distance(a, b):
+        """Levenshtein distance, counting a swap of adjacent characters as one edit"""
+        previous, current = None, list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            previous, current, row = current, [i] + [0] * len(b), previous
+            for j in range(1, len(b) + 1):
+                cost = a[i - 1] != b[j - 1]
+                current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    current[j] = min(current[j], row[j - 2] + 1)
+        return current[-1]
+
+    def _best_match(self, key):
+        """Find the indexed key with the highest trigram Dice similarity"""
+        query = self._trigrams_of(key)
+        shared = defaultdict(int)
+        for trigram in query:
+            for candidate in self._trigrams.get(trigram, ()):
+                shared[candidate] += 1
+
+        # Names that differ only by a number ("Blink-182" / "Blink-183") are different artists
+        numbers = self._numbers_of(key)
+        best, best_score = None, self.fuzzy_threshold
+        for candidate, count in shared.items():
+            if self._numbers_of(candidate) != numbers:
+                continue
+            score = 2 * count / (len(query) + self._trigram_counts[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _index(self, key, artist_id):
+        """Add a normalized key; call with the lock held (or before sharing)"""
+        self._ids[key] = artist_id
+        trigrams = self._trigrams_of(key)
+        self._trigram_counts[key] = len(trigrams)
+        for trigram in trigrams:
+            self._trigrams[trigram].add(key)
+
+    def _load(self):
+        """Load the index from disk if it exists"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Could not load artist index: {e}")
+            return
+
+        for key, artist_id in entries.items():
+            self._index(key, artist_id)
+        print(f"✅ Loaded {len(self._ids)} artist names from index")
+
+    def save(self):
+        """Atomically write the index to disk if it has changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._ids)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Could not save artist index: {e}")
+            with self._lock:
+                self._dirty = True
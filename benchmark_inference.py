@@ -0,0 +1,114 @@
+"""Compare local conversation model backends and inference modes.
+
+Each configuration is loaded in a fresh subprocess so load time and resident
+memory are measured in isolation. Configurations are ``backend:mode`` pairs:
+
+    python benchmark_inference.py --model microsoft/DialoGPT-medium \
+        --configs pytorch:fp32 pytorch:int8 onnx:fp32
+
+The first configuration is the baseline. A greedy reply to a fixed prompt is
+compared against it to check that the backends produce matching output.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PARITY_PROMPT = "Music Assistant: Who is your favourite artist?\n\nResponse:"
+
+
+def child(model_name):
+    """Load the chatbot model in this process and print its stats as JSON"""
+    import torch
+    from music_chatbot import MusicChatbot
+
+    bot = MusicChatbot(model_name=model_name)
+    stats = dict(getattr(bot, 'model_stats', None) or {})
+    if stats:
+        inputs = bot.tokenizer(PARITY_PROMPT, return_tensors="pt")
+        with torch.inference_mode():
+            output = bot.model.generate(
+                **inputs, max_new_tokens=20, do_sample=False, pad_token_id=bot.tokenizer.eos_token_id
+            )
+        stats['sample'] = bot.tokenizer.decode(output[0, inputs['input_ids'].shape[-1]:], skip_special_tokens=True)
+    print('MODEL_STATS=' + json.dumps(stats))
+
+
+def run_config(model_name, config, warmup_runs):
+    """Run one backend:mode configuration in a subprocess and return its stats"""
+    backend, _, mode = config.partition(':')
+    env = dict(
+        os.environ,
+        CHAT_MODEL_BACKEND=backend,
+        CHAT_MODEL_INFERENCE_MODE=mode or 'fp32',
+        CHAT_MODEL_WARMUP_RUNS=str(warmup_runs)
+    )
+    result = subprocess.run(
+        [sys.executable, __file__, '--child', '--model', model_name],
+        env=env, capture_output=True, text=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('MODEL_STATS='):
+            return json.loads(line[len('MODEL_STATS='):]) or None
+    print(result.stderr[-2000:], file=sys.stderr)
+    return None
+
+
+def _value(value):
+    """A stat for the table; 'n/a' when it wasn't measured (e.g. no warmup runs)"""
+    return 'n/a' if value is None else value
+
+
+def _ratio(value, baseline):
+    """``value`` relative to the baseline, or 'n/a' when either wasn't measured"""
+    if value is None or not baseline:
+        return 'n/a'
+    return f"x{value / baseline:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='microsoft/DialoGPT-medium')
+    parser.add_argument('--configs', nargs='+', default=['pytorch:fp32', 'pytorch:int8', 'onnx:fp32'])
+    parser.add_argument('--warmup-runs', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.model)
+        return
+
+    results = {config: run_config(args.model, config, args.warmup_runs) for config in args.configs}
+    baseline = results.get(args.configs[0])
+
+    print(f"\n{'config':<14}{'load s':>9}{'RSS MB':>9}{'1st tok ms':>12}{'tokens/s':>10}  output")
+    for config, stats in results.items():
+        if not stats:
+            print(f"{config:<14}{'failed':>9}")
+            continue
+        matches = 'baseline' if stats is baseline else (
+            'matches' if baseline and stats['sample'] == baseline['sample'] else 'differs'
+        )
+        # The chatbot falls back (e.g. onnx has no int8 mode); label what actually ran
+        backend, _, mode = config.partition(':')
+        ran = f"{stats.get('backend')}:{stats.get('mode')}"
+        if ran != f"{backend}:{mode or 'fp32'}":
+            matches += f" (ran as {ran})"
+        print(f"{config:<14}{_value(stats.get('load_seconds')):>9}{_value(stats.get('rss_mb')):>9}"
+              f"{_value(stats.get('first_token_ms')):>12}{_value(stats.get('tokens_per_second')):>10}  {matches}")
+
+    if baseline:
+        for config, stats in results.items():
+            if stats and stats is not baseline:
+                ratios = {
+                    label: _ratio(stats.get(key), baseline.get(key))
+                    for label, key in (('load', 'load_seconds'), ('RSS', 'rss_mb'),
+                                       ('first token', 'first_token_ms'), ('tokens/s', 'tokens_per_second'))
+                }
+                print(f"\n{config} vs {args.configs[0]}: "
+                      + ', '.join(f"{label} {ratio}" for label, ratio in ratios.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a time-to-live"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return a live entry and mark it recently used, or the default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store an entry, evicting the least recently used one when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry and return its value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+_MISSING = object()
@@ -0,0 +1,75 @@
+"""Import-time regression check based on ``python -X importtime``.
+
+Imports each module in a fresh interpreter and fails if the total import time
+exceeds a budget or if any heavy dependency that should be deferred (torch,
+transformers, langchain, ...) was imported:
+
+    python check_import_time.py                     # checks app and music_chatbot
+    python check_import_time.py app --budget-ms 500 --top 15
+"""
+import argparse
+import subprocess
+import sys
+
+DEFERRED_PACKAGES = [
+    'torch', 'transformers', 'langchain', 'optimum', 'onnxruntime',
+    'openai', 'spotipy', 'certifi', 'numpy', 'pandas'
+]
+
+
+def measure(module):
+    """Return (total microseconds, {direct import: cumulative microseconds}) for a module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    total, breakdown = 0, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown as two extra spaces of indentation per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total += int(cumulative)
+        if depth <= 1 and name.strip() != module:
+            breakdown[name.strip()] = int(cumulative)
+    return total, breakdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=['app', 'music_chatbot'])
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        total, breakdown = measure(module)
+        total_ms = total / 1000
+        print(f"\n{module}: {total_ms:.0f} ms total (budget {args.budget_ms:.0f} ms)")
+        for name, micros in sorted(breakdown.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {micros / 1000:8.1f} ms  {name}")
+
+        loaded = subprocess.run(
+            [sys.executable, '-c', f'import sys, {module}; print("\\n".join(sys.modules))'],
+            capture_output=True, text=True
+        ).stdout.split()
+        heavy = sorted({name.split('.')[0] for name in loaded} & set(DEFERRED_PACKAGES))
+
+        if heavy:
+            print(f"❌ {module} imports deferred dependencies at load time: {', '.join(heavy)}")
+            failed = True
+        if total_ms > args.budget_ms:
+            print(f"❌ {module} import time {total_ms:.0f} ms exceeds budget")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+class FieldsError(ValueError):
+    """Raised for a malformed fields selector"""
+
+
+def parse_fields(value):
+    """Parse a ``fields=`` selector into a nested spec, or None to keep everything.
+
+    Uses Spotify's syntax: comma-separated keys, with a parenthesized selector
+    for the keys of a nested object or list of objects, e.g.
+    ``name,genres,top_tracks(name,popularity)``. A key without a selector
+    keeps its whole value. Raises FieldsError on malformed input.
+    """
+    text = (value or '').replace(' ', '')
+    if not text:
+        return None
+    spec, end = _parse(text, 0)
+    if end != len(text):
+        raise FieldsError(f"Unexpected ')' in fields at position {end}")
+    return spec
+
+
+def _parse(text, pos):
+    spec = {}
+    while pos < len(text):
+        end = pos
+        while end < len(text) and text[end] not in ',()':
+            end += 1
+        key = text[pos:end]
+        if not key:
+            raise FieldsError(f"Empty field name in fields at position {pos}")
+        pos = end
+        if pos < len(text) and text[pos] == '(':
+            spec[key], pos = _parse(text, pos + 1)
+            if pos >= len(text) or text[pos] != ')':
+                raise FieldsError(f"Missing ')' after fields of '{key}'")
+            pos += 1
+        else:
+            spec[key] = None
+        if pos < len(text) and text[pos] == ')':
+            return spec, pos
+        if pos < len(text):
+            if text[pos] != ',':
+                raise FieldsError(f"Expected ',' in fields at position {pos}")
+            pos += 1
+    return spec, pos
+
+
+def select_fields(data, spec):
+    """Keep only the fields in ``spec`` of a dict, or of every dict in a list"""
+    if spec is None:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, spec) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: select_fields(data[key], sub_spec)
+        for key, sub_spec in spec.items() if key in data
+    }
+
+
+def merge_fields(*specs):
+    """Union of several field specs"""
+    merged = {}
+    for spec in specs:
+        for key, sub_spec in spec.items():
+            if key in merged and (merged[key] is None or sub_spec is None):
+                merged[key] = None
+            elif key in merged:
+                merged[key] = merge_fields(merged[key], sub_spec)
+            else:
+                merged[key] = sub_spec
+    return merged
+
+
+def format_fields(spec):
+    """Render a field spec back into the ``fields=`` syntax"""
+    return ','.join(
+        key if sub_spec is None else f"{key}({format_fields(sub_spec)})"
+        for key, sub_spec in spec.items()
+    )
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Tuple
+
+import torch
+
+from generation_utils import sentence_length
+
+
+class GenerationBatcher:
+    """Micro-batching scheduler for local text generation.
+
+    Prompts submitted from many request threads are gathered for up to
+    ``window_ms`` (or until ``max_batch_size`` are waiting), run through one
+    padded batched ``generate`` call, and each result is handed back to its
+    caller through a Future. Replies are cut at the end of their first
+    sentence, like streamed replies, and prompts longer than
+    ``max_prompt_tokens`` keep only their end.
+    """
+
+    def __init__(self, model, tokenizer, window_ms: float = 20, max_batch_size: int = 8,
+                 max_queue_size: int = 64, max_prompt_tokens: Optional[int] = None, **generate_kwargs):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_prompt_tokens = max_prompt_tokens
+        self.generate_kwargs = generate_kwargs
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = threading.Thread(target=self._run, name='generation-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str) -> Future:
+        """Queue a prompt; raises queue.Full when the scheduler is saturated"""
+        future = Future()
+        self._queue.put_nowait((prompt, future))
+        return future
+
+    def generate(self, prompt: str, timeout: float = 30) -> str:
+        """Generate a continuation for a prompt, waiting for its batch to run"""
+        future = self.submit(prompt)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Nobody is waiting any more; don't spend a batch slot on it if not yet started
+            future.cancel()
+            raise
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """Block for one prompt, then gather more until the window closes.
+
+        Prompts whose callers gave up (cancelled futures) are dropped here so
+        they take no place in the batch.
+        """
+        batch = []
+        while not batch:
+            item = self._queue.get()
+            if not item[1].cancelled():
+                batch.append(item)
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if not item[1].cancelled():
+                batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                texts = self._generate_batch([prompt for prompt, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        """Run one padded generate pass and decode only the new tokens"""
+        input_ids, attention_mask = self._pad_left(prompts)
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **self.generate_kwargs
+            )
+        eos_token_id = self.generate_kwargs.get('eos_token_id', self.tokenizer.eos_token_id)
+        texts = []
+        for tokens in output[:, input_ids.shape[-1]:].tolist():
+            # Finished rows are padded after EOS; a streamed reply would have ended there
+            if eos_token_id in tokens:
+                tokens = tokens[:tokens.index(eos_token_id)]
+            tokens = tokens[:sentence_length(self.tokenizer, tokens)]
+            texts.append(self.tokenizer.decode(tokens, skip_special_tokens=True).strip())
+        return texts
+
+    def _pad_left(self, prompts: List[str]):
+        """(input_ids, attention_mask) padded on the left, so generation continues
+        directly after each prompt, without changing the shared tokenizer"""
+        encoded = [self.tokenizer(prompt)['input_ids'] for prompt in prompts]
+        if self.max_prompt_tokens:
+            encoded = [ids[-self.max_prompt_tokens:] for ids in encoded]
+        width = max(len(ids) for ids in encoded)
+        pad = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad] * (width - len(ids)) + ids for ids in encoded])
+        attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded])
+        return input_ids, attention_mask
@@ -0,0 +1,31 @@
+from transformers import StoppingCriteria
+
+
+class SentenceStoppingCriteria(StoppingCriteria):
+    """Stop generation once the reply has ended a sentence"""
+    
+    def __init__(self, tokenizer, prompt_length: int, min_new_tokens: int = 8):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.min_new_tokens = min_new_tokens
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        generated = input_ids[0, self.prompt_length:]
+        if len(generated) < self.min_new_tokens:
+            return False
+        return ends_sentence(self.tokenizer, generated)
+
+
+def ends_sentence(tokenizer, generated) -> bool:
+    """Whether generated tokens end with a sentence end"""
+    # Only the last few tokens can complete a sentence
+    tail = tokenizer.decode(generated[-3:], skip_special_tokens=True).rstrip()
+    return tail.endswith(('.', '!', '?'))
+
+
+def sentence_length(tokenizer, generated, min_new_tokens: int = 8) -> int:
+    """Number of generated tokens kept where SentenceStoppingCriteria would have stopped"""
+    for length in range(min_new_tokens, len(generated) + 1):
+        if ends_sentence(tokenizer, generated[:length]):
+            return length
+    return len(generated)
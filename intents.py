@@ -0,0 +1,38 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+# Conjunctions and punctuation that can separate independent requests in one message
+_CONJUNCTION = r'(?:and also|and then|and|also|plus|then)'
+_CLAUSE_SEPARATOR = re.compile(
+    rf'(\s*[;,]\s*(?:{_CONJUNCTION}\s+)?|[?!.]\s+(?:{_CONJUNCTION}\s+)?|\s+{_CONJUNCTION}\s+)',
+    re.IGNORECASE
+)
+
+
+def split_intents(text: str, detect: Callable[[str], Optional[str]]) -> List[Tuple[str, str]]:
+    """Split a message into (intent, clause) pairs, one per independent request.
+
+    Clauses without an intent of their own are glued back onto the clause
+    before them, so "tell me about Simon and Garfunkel" stays one artist
+    request while "what's trending and tell me about Dua Lipa" becomes two.
+    When fewer than two intents are found the whole message is returned as a
+    single request.
+    """
+    parts = _CLAUSE_SEPARATOR.split(text)
+    segments = []
+    pending_separator = ''
+    for i in range(0, len(parts), 2):
+        clause = parts[i]
+        intent = detect(clause.lower()) if clause.strip() else None
+        if intent:
+            segments.append([intent, clause])
+        elif segments:
+            segments[-1][1] += pending_separator + clause
+        else:
+            segments.append([None, clause])
+        pending_separator = parts[i + 1] if i + 1 < len(parts) else ''
+
+    segments = [(intent, clause.strip()) for intent, clause in segments if intent]
+    if len(segments) < 2:
+        return [(detect(text.lower()), text)]
+    return segments
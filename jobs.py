@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already waiting"""
+
+
+class Job:
+    """A unit of background work and its outcome"""
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        job = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == 'done':
+            job['result'] = self.result
+        elif self.status == 'error':
+            job['error'] = self.error
+        return job
+
+
+class JobQueue:
+    """Bounded worker pool for slow generation requests, deduplicated by input key.
+
+    Submitting returns a job right away; a request for the same (kind, key)
+    while that job is queued, running or recently finished returns the
+    existing job instead of starting another one. Once ``max_queued`` jobs
+    are waiting, new submissions are rejected with JobQueueFull.
+    """
+
+    def __init__(self, workers=4, max_queued=100, result_ttl=600, max_jobs=10000):
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        # Unfinished jobs are kept a day at most; finished ones for result_ttl
+        self._jobs = TTLCache(maxsize=max_jobs, ttl=24 * 3600)
+        self._by_key = TTLCache(maxsize=max_jobs, ttl=24 * 3600)
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    def submit(self, kind, key, fn, *args):
+        """Return the job computing fn(*args) for this (kind, key), starting one if needed"""
+        with self._lock:
+            job = self._jobs.get(self._by_key.get((kind, key)))
+            if job and job.status != 'error':
+                return job
+            if self._queued >= self.max_queued:
+                raise JobQueueFull(f"{self._queued} jobs are already waiting")
+
+            job = Job(kind, key)
+            self._jobs.set(job.id, job)
+            self._by_key.set((kind, key), job.id)
+            self._queued += 1
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        with self._lock:
+            self._queued -= 1
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'error'
+        job.finished_at = time.time()
+        # Keep the outcome around for pollers and duplicate requests, then let it expire
+        self._jobs.set(job.id, job, ttl=self.result_ttl)
+        self._by_key.set((job.kind, job.key), job.id, ttl=self.result_ttl)
+        job.done.set()
+
+    def stats(self):
+        return {'queued': self._queued, 'tracked': len(self._jobs)}
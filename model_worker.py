@@ -0,0 +1,218 @@
+"""Out-of-process host for the local conversation model.
+
+Run one or more workers, each on its own Unix socket:
+
+    CHAT_MODEL_WORKER_AUTHKEY=<secret> python model_worker.py --address /tmp/music-model-0.sock
+
+and point request-handling processes at them with
+``CHAT_MODEL_WORKER=/tmp/music-model-0.sock[,/tmp/music-model-1.sock]`` and
+the same ``CHAT_MODEL_WORKER_AUTHKEY``.
+Those processes then talk to the workers over local IPC and never load
+torch or the model themselves.
+"""
+import argparse
+import itertools
+import os
+import queue
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Iterator, List
+
+
+def _authkey() -> bytes:
+    """Shared secret for worker connections, which carry pickled messages.
+
+    There is no default: anyone who knows the key can send the worker
+    arbitrary pickles, so it must be set (and kept private) on both sides.
+    """
+    key = os.getenv('CHAT_MODEL_WORKER_AUTHKEY', '')
+    if not key:
+        raise RuntimeError("CHAT_MODEL_WORKER_AUTHKEY must be set to use model workers")
+    return key.encode('utf-8')
+
+
+class ModelWorkerBusy(RuntimeError):
+    """Raised when a worker's request queue is full"""
+
+
+class ModelWorkerClient:
+    """Client for one or more model workers, with pooled connections and timeouts"""
+
+    def __init__(self, addresses: List[str], timeout: float = 30, pool_size: int = 4):
+        self.addresses = addresses
+        self.timeout = timeout
+        self._authkey = _authkey()
+        self._next_address = itertools.cycle(addresses)
+        self._pools = {address: queue.LifoQueue(maxsize=pool_size) for address in addresses}
+
+    def generate(self, prompt: str) -> str:
+        """Generate a complete reply for a prompt"""
+        return ''.join(self._request('generate', prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Stream a reply for a prompt as the worker generates it"""
+        return self._request('stream', prompt)
+
+    def _request(self, op: str, prompt: str) -> Iterator[str]:
+        """Send a request to the next available worker and yield reply chunks.
+
+        A pooled connection whose worker has restarted fails on first use; it
+        is dropped (with the rest of that worker's pool) and the request is
+        retried once on a fresh connection, as long as nothing was yielded yet.
+        """
+        last_error = None
+        for _ in range(len(self.addresses)):
+            address = next(self._next_address)
+            fresh = False
+            while True:
+                try:
+                    conn, pooled = self._connect(address, fresh)
+                except OSError as e:
+                    last_error = e
+                    break
+                replied = False
+                try:
+                    for chunk in self._read_reply(address, conn, op, prompt):
+                        replied = True
+                        yield chunk
+                    return
+                except TimeoutError:
+                    raise
+                except (EOFError, OSError) as e:
+                    if replied or not pooled:
+                        raise
+                    last_error = e
+                    self._drain_pool(address)
+                    fresh = True
+        raise ConnectionError(f"No model worker reachable: {last_error}")
+
+    def _connect(self, address: str, fresh: bool = False):
+        """(connection, whether it came from the pool)"""
+        if not fresh:
+            try:
+                return self._pools[address].get_nowait(), True
+            except queue.Empty:
+                pass
+        return Client(address, family='AF_UNIX', authkey=self._authkey), False
+
+    def _drain_pool(self, address: str) -> None:
+        """Close pooled connections to a worker, which are stale once one is"""
+        pool = self._pools[address]
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                return
+            except OSError:
+                pass
+
+    def _read_reply(self, address: str, conn, op: str, prompt: str) -> Iterator[str]:
+        reusable = False
+        try:
+            conn.send({'op': op, 'prompt': prompt})
+            while True:
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"Model worker did not respond within {self.timeout}s")
+                message = conn.recv()
+                if 'error' in message:
+                    reusable = True
+                    if message.get('busy'):
+                        raise ModelWorkerBusy(message['error'])
+                    raise RuntimeError(message['error'])
+                if message.get('done'):
+                    reusable = True
+                    return
+                yield message['chunk']
+        finally:
+            # Connections with a reply still in flight can't be reused
+            if reusable:
+                try:
+                    self._pools[address].put_nowait(conn)
+                    conn = None
+                except queue.Full:
+                    pass
+            if conn is not None:
+                conn.close()
+
+
+class ModelWorkerServer:
+    """Serves generation requests for a single loaded MusicChatbot model"""
+
+    def __init__(self, address: str, max_pending: int = 32, concurrency: int = 1):
+        # Import here so clients of this module never pull in torch
+        from music_chatbot import MusicChatbot
+
+        self.address = address
+        self.chatbot = MusicChatbot(model_name=os.getenv('CHAT_MODEL_NAME', 'microsoft/DialoGPT-medium'))
+        if self.chatbot.model is None:
+            raise RuntimeError("Model failed to load; see errors above")
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._running = threading.Semaphore(concurrency)
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family='AF_UNIX', authkey=_authkey()) as listener:
+            # Only this user may connect at all
+            os.chmod(self.address, 0o600)
+            print(f"✅ Model worker listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"⚠️ Rejected model worker connection: {e}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _handle_connection(self, conn) -> None:
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self._handle_request(conn, request)
+
+    def _handle_request(self, conn, request) -> None:
+        if not self._pending.acquire(blocking=False):
+            conn.send({'error': 'Model worker queue is full', 'busy': True})
+            return
+        try:
+            # Batched generation shares passes across requests; streams run one at a time
+            if request['op'] == 'generate' and self.chatbot.batcher:
+                conn.send({'chunk': self.chatbot.generate_from_prompt(request['prompt'])})
+            else:
+                with self._running:
+                    if request['op'] == 'stream':
+                        for chunk in self.chatbot.stream_prompt(request['prompt']):
+                            conn.send({'chunk': chunk})
+                    else:
+                        conn.send({'chunk': self.chatbot.generate_from_prompt(request['prompt'])})
+            conn.send({'done': True})
+        except (EOFError, OSError):
+            pass
+        except Exception as e:
+            conn.send({'error': str(e)})
+        finally:
+            self._pending.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host the local conversation model for other processes")
+    parser.add_argument('--address', default=os.getenv('CHAT_MODEL_WORKER', '/tmp/music-model.sock').split(',')[0])
+    parser.add_argument('--max-pending', type=int, default=int(os.getenv('CHAT_MODEL_WORKER_MAX_PENDING', '32')))
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        _authkey()
+    except RuntimeError as e:
+        parser.exit(1, f"❌ {e}\n")
+
+    # The worker loads the model itself; make sure it doesn't try to delegate to another worker
+    os.environ.pop('CHAT_MODEL_WORKER', None)
+    ModelWorkerServer(args.address, max_pending=args.max_pending, concurrency=args.concurrency).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
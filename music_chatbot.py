@@ -1,15 +1,28 @@
 import os
-from typing import Dict, List, Any
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-import torch
-from langchain.llms.base import LLM
-from langchain.schema import BaseMessage, HumanMessage, AIMessage
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
-from langchain.prompts import PromptTemplate
+import sys
+from typing import Dict, List, Any, Iterator
 from music_service import MusicDataService, LyricsService
+from session_memory import SessionStore, estimate_tokens
+from model_worker import ModelWorkerClient
+from intents import split_intents
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
+import threading
+import time
+
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        import resource
+        # Peak RSS; reported in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
 
 class MusicChatbot:
     """Main chatbot class that handles music-related conversations"""
@@ -18,39 +31,193 @@ class MusicChatbot:
         self.music_service = MusicDataService()
         self.lyrics_service = LyricsService()
         self.model_name = model_name
-        self.conversation_memory = ConversationBufferMemory()
+        self.dispatch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CHAT_DISPATCH_WORKERS', '8')),
+            thread_name_prefix='chat'
+        )
         self.setup_llm()
+        self.setup_batching()
+        self.setup_conversation_memory()
         self.setup_conversation_chain()
     
     def setup_llm(self):
-        """Setup the language model for conversation"""
+        """Setup the language model for conversation.
+        
+        CHAT_MODEL_INFERENCE_MODE=int8 dynamically quantizes the linear layers
+        for CPU inference, caps the torch thread count and runs warm-up
+        generations at load time so the first request doesn't pay for lazy
+        kernel initialization. CHAT_MODEL_BACKEND=onnx runs the model through
+        an exported ONNX Runtime graph with past-key-value caching instead.
+        """
+        # Reply budget in tokens for general conversation
+        self.max_new_tokens = int(os.getenv('CHAT_MAX_NEW_TOKENS', '100'))
+        self.model_client = None
+        self.model = None
+        
+        worker_addresses = os.getenv('CHAT_MODEL_WORKER')
+        if worker_addresses:
+            # The model lives in separate worker processes (see model_worker.py)
+            self.model_client = ModelWorkerClient(
+                worker_addresses.split(','),
+                timeout=float(os.getenv('CHAT_MODEL_WORKER_TIMEOUT', '30'))
+            )
+            print(f"✅ Using model worker(s) at {worker_addresses}")
+            return
+        
         try:
+            # Heavy imports are deferred until a local model is actually loaded
+            import torch
+            from transformers import AutoTokenizer, AutoModelForCausalLM
+            
+            started = time.perf_counter()
+            self.backend = os.getenv('CHAT_MODEL_BACKEND', 'pytorch').lower()
+            self.inference_mode = os.getenv('CHAT_MODEL_INFERENCE_MODE', 'fp32').lower()
+            quantized = self.inference_mode == 'int8' and self.backend == 'pytorch'
+            if self.inference_mode == 'int8' and not quantized:
+                # Dynamic int8 quantization only applies to the PyTorch model; report what actually runs
+                print(f"⚠️ CHAT_MODEL_INFERENCE_MODE=int8 is not supported with the {self.backend} backend, using fp32")
+                self.inference_mode = 'fp32'
+            
+            threads = os.getenv('CHAT_MODEL_THREADS') or (str(min(4, os.cpu_count() or 1)) if quantized else None)
+            if threads:
+                torch.set_num_threads(int(threads))
+            
             # Try to use a local model first
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+            if self.backend == 'onnx':
+                self.model = self._load_onnx_model()
+            else:
+                self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+                if quantized:
+                    self.model = self._quantize_int8(self.model)
+                self.model.eval()
             
             # Add padding token if not present
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
-            self.text_generator = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                max_length=1000,
-                num_return_sequences=1,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
+            load_seconds = time.perf_counter() - started
+            warmup_runs = int(os.getenv('CHAT_MODEL_WARMUP_RUNS', '2' if quantized else '0'))
+            timings = self._warm_up(warmup_runs) if warmup_runs else {}
+            
+            self.model_stats = {
+                'backend': self.backend,
+                'mode': self.inference_mode,
+                'threads': torch.get_num_threads(),
+                'load_seconds': round(load_seconds, 2),
+                'rss_mb': round(rss_mb(), 1),
+                'first_token_ms': timings.get('first_token_ms'),
+                'tokens_per_second': timings.get('tokens_per_second')
+            }
+            print(f"✅ Loaded {self.model_name} ({self.backend}, {self.inference_mode}) in {load_seconds:.1f}s, "
+                  f"RSS {self.model_stats['rss_mb']} MB, {self.model_stats['tokens_per_second'] or 'n/a'} tokens/s")
             
         except Exception as e:
             print(f"Error setting up model: {e}")
-            self.text_generator = None
+            self.model = None
+    
+    def _load_onnx_model(self):
+        """Load (exporting on first use) an ONNX Runtime graph with KV caching"""
+        from optimum.onnxruntime import ORTModelForCausalLM
+        
+        export_dir = os.path.join(
+            os.getenv('ONNX_MODEL_DIR', 'data/onnx'), self.model_name.replace('/', '--')
+        )
+        if os.path.isdir(export_dir):
+            return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+        
+        print(f"🔧 Exporting {self.model_name} to ONNX (one-time)...")
+        model = ORTModelForCausalLM.from_pretrained(self.model_name, export=True, use_cache=True)
+        model.save_pretrained(export_dir)
+        return model
+    
+    @staticmethod
+    def _quantize_int8(model):
+        """Apply dynamic int8 quantization to the model's linear layers"""
+        import torch
+        from transformers.pytorch_utils import Conv1D
+        
+        # GPT-2 style models (DialoGPT) implement their projections as Conv1D;
+        # rewrite them as nn.Linear so dynamic quantization covers them too
+        for parent in list(model.modules()):
+            for name, child in list(parent.named_children()):
+                if isinstance(child, Conv1D):
+                    in_features, out_features = child.weight.shape
+                    linear = torch.nn.Linear(in_features, out_features)
+                    linear.weight.data = child.weight.data.t().contiguous()
+                    linear.bias.data = child.bias.data
+                    setattr(parent, name, linear)
+        
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    def _warm_up(self, runs: int, new_tokens: int = 16) -> Dict[str, float]:
+        """Run short greedy generations to initialize kernels; returns timings of the last run"""
+        import torch
+        
+        inputs = self.tokenizer("Music Assistant: What's trending?\n\nResponse:", return_tensors="pt")
+        timings = {}
+        with torch.inference_mode():
+            for _ in range(runs):
+                started = time.perf_counter()
+                self.model.generate(
+                    **inputs,
+                    max_new_tokens=1,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+                first_token = time.perf_counter() - started
+                
+                started = time.perf_counter()
+                output = self.model.generate(
+                    **inputs,
+                    max_new_tokens=new_tokens,
+                    min_new_tokens=new_tokens,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.eos_token_id
+                )
+                generated = output.shape[-1] - inputs['input_ids'].shape[-1]
+                timings = {
+                    'first_token_ms': round(first_token * 1000, 1),
+                    'tokens_per_second': round(generated / (time.perf_counter() - started), 1)
+                }
+        return timings
+    
+    def setup_batching(self):
+        """Optionally route general conversation through a micro-batching queue"""
+        self.batcher = None
+        if self.model is not None and os.getenv('CHAT_BATCHING', 'false').lower() in ('1', 'true', 'yes'):
+            from generation_batcher import GenerationBatcher
+            self.batcher = GenerationBatcher(
+                self.model,
+                self.tokenizer,
+                window_ms=float(os.getenv('CHAT_BATCH_WINDOW_MS', '20')),
+                max_batch_size=int(os.getenv('CHAT_BATCH_MAX_SIZE', '8')),
+                max_prompt_tokens=self._context_tokens() - self.max_new_tokens,
+                max_new_tokens=self.max_new_tokens,
+                eos_token_id=self.tokenizer.eos_token_id,
+                temperature=0.7,
+                do_sample=True
+            )
+    
+    def setup_conversation_memory(self):
+        """Setup bounded per-session conversation memory"""
+        count_tokens = estimate_tokens
+        if getattr(self, 'tokenizer', None) is not None:
+            count_tokens = lambda text: len(self.tokenizer.encode(text))
+        
+        self.conversation_memory = SessionStore(
+            max_turns=int(os.getenv('CHAT_MEMORY_MAX_TURNS', '10')),
+            max_tokens=int(os.getenv('CHAT_MEMORY_MAX_TOKENS', '1000')),
+            idle_ttl=float(os.getenv('CHAT_MEMORY_IDLE_TTL', '1800')),
+            max_sessions=int(os.getenv('CHAT_MEMORY_MAX_SESSIONS', '1000')),
+            max_total_tokens=int(os.getenv('CHAT_MEMORY_MAX_TOTAL_TOKENS', '200000')),
+            count_tokens=count_tokens
+        )
     
     def setup_conversation_chain(self):
-        """Setup the conversation chain with memory"""
-        template = """
+        """Setup the conversation prompt template"""
+        self._prompt = None
+        self._prompt_template = """
         You are a music assistant chatbot specialized in trending music, artists, and lyrics.
         
         Your capabilities include:
@@ -67,27 +234,59 @@ class MusicChatbot:
         
         User: {input}
         Assistant:"""
-        
-        self.prompt = PromptTemplate(
-            input_variables=["history", "input"],
-            template=template
-        )
     
-    def process_user_input(self, user_input: str) -> str:
+    @property
+    def prompt(self):
+        """LangChain prompt template, built on first use so langchain is only imported when needed"""
+        if self._prompt is None:
+            from langchain.prompts import PromptTemplate
+            self._prompt = PromptTemplate(
+                input_variables=["history", "input"],
+                template=self._prompt_template
+            )
+        return self._prompt
+    
+    def process_user_input(self, user_input: str, session_id: str = "default") -> str:
         """Process user input and generate appropriate response"""
-        user_input_lower = user_input.lower()
+        requests = split_intents(user_input, self._detect_specific_intent)
+        if len(requests) > 1:
+            # Independent requests in one message are answered concurrently
+            futures = [
+                self.dispatch_executor.submit(self._handle_intent, intent, clause, session_id)
+                for intent, clause in requests
+            ]
+            return "\n\n".join(future.result() for future in futures)
         
-        # Check for specific music-related intents
-        if self._is_trending_songs_request(user_input_lower):
+        return self._handle_intent(self._detect_intent(user_input.lower()), user_input, session_id)
+    
+    def _handle_intent(self, intent: str, user_input: str, session_id: str) -> str:
+        if intent == 'trending':
             return self._handle_trending_songs_request(user_input)
-        elif self._is_artist_info_request(user_input_lower):
+        elif intent == 'artist':
             return self._handle_artist_info_request(user_input)
-        elif self._is_lyrics_request(user_input_lower):
+        elif intent == 'lyrics':
             return self._handle_lyrics_request(user_input)
-        elif self._is_song_search_request(user_input_lower):
+        elif intent == 'search':
             return self._handle_song_search_request(user_input)
         else:
-            return self._handle_general_conversation(user_input)
+            return self._handle_general_conversation(user_input, session_id)
+    
+    def _detect_specific_intent(self, text: str):
+        """Like _detect_intent, but None for clauses without a music-specific intent"""
+        intent = self._detect_intent(text)
+        return None if intent == 'general' else intent
+    
+    def _detect_intent(self, text: str) -> str:
+        """Check for specific music-related intents, falling back to general conversation"""
+        if self._is_trending_songs_request(text):
+            return 'trending'
+        elif self._is_artist_info_request(text):
+            return 'artist'
+        elif self._is_lyrics_request(text):
+            return 'lyrics'
+        elif self._is_song_search_request(text):
+            return 'search'
+        return 'general'
     
     def _is_trending_songs_request(self, text: str) -> bool:
         """Check if user is asking for trending songs"""
@@ -138,6 +337,8 @@ class MusicChatbot:
                     response += f"   Popularity: {song['popularity']}/100\n\n"
                 
                 response += "Would you like more details about any of these songs, or their lyrics?"
+                # The follow-up is usually about one of these artists; warm them now
+                self.music_service.prefetch_artists(trending_songs)
                 return response
             else:
                 return "I'm sorry, I couldn't fetch the trending songs right now. Please try again later."
@@ -231,6 +432,7 @@ class MusicChatbot:
                     response += f"   Popularity: {song['popularity']}/100\n\n"
                 
                 response += "Would you like more details about any of these songs?"
+                self.music_service.prefetch_artists(songs)
                 return response
             else:
                 return f"I couldn't find any songs matching '{search_query}'. Please try a different search term."
@@ -238,23 +440,11 @@ class MusicChatbot:
         except Exception as e:
             return f"I encountered an error while searching for songs: {str(e)}"
     
-    def _handle_general_conversation(self, user_input: str) -> str:
+    def _handle_general_conversation(self, user_input: str, session_id: str = "default") -> str:
         """Handle general conversation about music"""
         try:
-            if self.text_generator:
-                # Use the LLM for general conversation
-                prompt = f"Music Assistant: {user_input}\n\nResponse:"
-                
-                result = self.text_generator(
-                    prompt,
-                    max_length=len(prompt.split()) + 100,
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-                
-                response = result[0]['generated_text'][len(prompt):].strip()
+            if self.model is not None or self.model_client:
+                response = self.generate_from_prompt(self._build_general_prompt(user_input, session_id))
                 
                 # Add music context if response is too generic
                 if len(response) < 20:
@@ -267,6 +457,91 @@ class MusicChatbot:
         except Exception as e:
             return self._generate_music_context_response(user_input)
     
+    def _build_general_prompt(self, user_input: str, session_id: str) -> str:
+        """Prompt for the local model, with as much of the session's recent window as fits.
+        
+        History, question and reply budget together stay within the model's
+        positions (1024 for DialoGPT).
+        """
+        question = f"Music Assistant: {user_input}\n\nResponse:"
+        budget = self._context_tokens() - self.max_new_tokens - self.conversation_memory.count_tokens(question) - 2
+        history = self.conversation_memory.render(session_id, max_tokens=max(budget, 0))
+        prompt = f"{history}\n\n" if history else ""
+        return prompt + question
+    
+    def _context_tokens(self) -> int:
+        """Positions the local model attends to, prompt and reply together"""
+        limit = getattr(getattr(self, 'tokenizer', None), 'model_max_length', None)
+        # Tokenizers without a known limit report a huge sentinel value
+        if not limit or limit > 100000:
+            limit = int(os.getenv('CHAT_MODEL_MAX_CONTEXT', '1024'))
+        return limit
+    
+    def stream_general_conversation(self, user_input: str, session_id: str = "default") -> Iterator[str]:
+        """Stream a local-model reply as it is generated, locally or from a model worker"""
+        prompt = self._build_general_prompt(user_input, session_id)
+        if self.model_client:
+            return self.model_client.stream(prompt)
+        return self.stream_prompt(prompt)
+    
+    def generate_from_prompt(self, prompt: str) -> str:
+        """Generate a complete reply, via a model worker, the batcher or a local stream"""
+        if self.model_client:
+            return self.model_client.generate(prompt).strip()
+        if self.batcher:
+            # Share one padded generate pass with other concurrent chats
+            return self.batcher.generate(prompt, timeout=float(os.getenv('CHAT_BATCH_TIMEOUT', '30')))
+        return ''.join(self.stream_prompt(prompt)).strip()
+    
+    def stream_prompt(self, prompt: str) -> Iterator[str]:
+        """Stream the local model's continuation of a prompt.
+        
+        Generation is bounded by a token budget (CHAT_MAX_NEW_TOKENS) and stops
+        early on EOS or once the reply ends a sentence.
+        """
+        import torch
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+        from generation_utils import SentenceStoppingCriteria
+        
+        inputs = self.tokenizer(prompt, return_tensors="pt")
+        # Keep the end of an over-long prompt so prompt and reply fit the model's positions
+        keep = self._context_tokens() - self.max_new_tokens
+        if inputs['input_ids'].shape[-1] > keep:
+            inputs = {name: value[:, -keep:] for name, value in inputs.items()}
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stopping_criteria = StoppingCriteriaList([
+            SentenceStoppingCriteria(self.tokenizer, inputs['input_ids'].shape[-1])
+        ])
+        
+        errors = []
+        
+        def generate():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_new_tokens=self.max_new_tokens,
+                        stopping_criteria=stopping_criteria,
+                        temperature=0.7,
+                        do_sample=True,
+                        eos_token_id=self.tokenizer.eos_token_id,
+                        pad_token_id=self.tokenizer.eos_token_id
+                    )
+            except Exception as e:
+                # Unblock the consumer; the error is re-raised below
+                errors.append(e)
+                streamer.end()
+        
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+    
     def _generate_music_context_response(self, user_input: str) -> str:
         """Generate a contextual response about music"""
         responses = [
@@ -340,19 +615,47 @@ class MusicChatbot:
         
         return ""
     
-    def chat(self, user_input: str) -> str:
+    def chat(self, user_input: str, session_id: str = "default") -> str:
         """Main chat interface"""
         try:
-            response = self.process_user_input(user_input)
+            response = self.process_user_input(user_input, session_id)
             
-            # Store conversation in memory
-            self.conversation_memory.chat_memory.add_user_message(user_input)
-            self.conversation_memory.chat_memory.add_ai_message(response)
+            # Store conversation in this session's bounded memory
+            self.conversation_memory.add_turn(session_id, user_input, response)
             
             return response
             
         except Exception as e:
             return f"I'm sorry, I encountered an error: {str(e)}. Please try again!"
+    
+    def chat_stream(self, user_input: str, session_id: str = "default") -> Iterator[str]:
+        """Chat interface that yields the reply incrementally.
+        
+        Local-model replies are streamed token by token; every other intent
+        yields its complete response as a single chunk.
+        """
+        chunks = []
+        try:
+            can_stream = self.model_client or (self.model is not None and not self.batcher)
+            if can_stream and self._detect_intent(user_input.lower()) == 'general':
+                for chunk in self.stream_general_conversation(user_input, session_id):
+                    chunks.append(chunk)
+                    yield chunk
+                
+                # Add music context if the streamed reply was too generic
+                if len(''.join(chunks).strip()) < 20:
+                    extra = self._generate_music_context_response(user_input)
+                    chunks.append(f"\n\n{extra}" if chunks else extra)
+                    yield chunks[-1]
+            else:
+                chunks.append(self.process_user_input(user_input, session_id))
+                yield chunks[-1]
+            
+            # Store conversation in this session's bounded memory
+            self.conversation_memory.add_turn(session_id, user_input, ''.join(chunks))
+            
+        except Exception as e:
+            yield f"I'm sorry, I encountered an error: {str(e)}. Please try again!"
 
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import requests
 import os
 from dotenv import load_dotenv
 import json
+from cache import TTLCache
+from prefetch import Prefetcher
 
 load_dotenv()
 
@@ -14,10 +13,27 @@ class MusicDataService:
         # Initialize Spotify client
         self.spotify = None
         self._setup_spotify()
+        # Recently fetched artist info, warmed in the background after list replies
+        self._artist_cache = TTLCache(
+            maxsize=int(os.getenv('ARTIST_CACHE_SIZE', '1000')),
+            ttl=float(os.getenv('ARTIST_CACHE_TTL', '600'))
+        )
+        self._prefetcher = None
+        if os.getenv('PREFETCH_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self._prefetcher = Prefetcher(
+                self.get_artist_info,
+                budget=int(os.getenv('PREFETCH_BUDGET_PER_MINUTE', '30')),
+                max_pending=int(os.getenv('PREFETCH_MAX_PENDING', '10')),
+                max_age=float(os.getenv('PREFETCH_MAX_AGE', '10'))
+            )
     
     def _setup_spotify(self):
         """Setup Spotify client with credentials"""
         try:
+            # Imported here so loading this module stays cheap
+            import spotipy
+            from spotipy.oauth2 import SpotifyClientCredentials
+            
             client_credentials_manager = SpotifyClientCredentials(
                 client_id=os.getenv('SPOTIFY_CLIENT_ID'),
                 client_secret=os.getenv('SPOTIFY_CLIENT_SECRET')
@@ -47,6 +63,7 @@ class MusicDataService:
                         'rank': idx + 1,
                         'title': track['name'],
                         'artist': ', '.join([artist['name'] for artist in track['artists']]),
+                        'artists': [artist['name'] for artist in track['artists']],
                         'album': track['album']['name'],
                         'release_date': track['album']['release_date'],
                         'duration_ms': track['duration_ms'],
@@ -65,126 +82,16 @@ class MusicDataService:
             return self._get_mock_trending_songs(limit)
     
     def _get_mock_trending_songs(self, limit=10):
-        """Mock trending songs data when API is not available"""
-        mock_songs = [
-            {
-                'rank': 1,
-                'title': 'Flowers',
-                'artist': 'Miley Cyrus',
-                'album': 'Endless Summer Vacation',
-                'release_date': '2023-01-13',
-                'duration_ms': 200000,
-                'popularity': 95,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 2,
-                'title': 'Anti-Hero',
-                'artist': 'Taylor Swift',
-                'album': 'Midnights',
-                'release_date': '2022-10-21',
-                'duration_ms': 201000,
-                'popularity': 94,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 3,
-                'title': 'Unholy',
-                'artist': 'Sam Smith, Kim Petras',
-                'album': 'Unholy',
-                'release_date': '2022-09-22',
-                'duration_ms': 156000,
-                'popularity': 92,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 4,
-                'title': 'As It Was',
-                'artist': 'Harry Styles',
-                'album': 'Harry\'s House',
-                'release_date': '2022-04-01',
-                'duration_ms': 167000,
-                'popularity': 91,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 5,
-                'title': 'Watermelon Sugar',
-                'artist': 'Harry Styles',
-                'album': 'Fine Line',
-                'release_date': '2019-12-13',
-                'duration_ms': 174000,
-                'popularity': 89,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 6,
-                'title': 'Blinding Lights',
-                'artist': 'The Weeknd',
-                'album': 'After Hours',
-                'release_date': '2019-11-29',
-                'duration_ms': 200000,
-                'popularity': 88,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 7,
-                'title': 'Good 4 U',
-                'artist': 'Olivia Rodrigo',
-                'album': 'SOUR',
-                'release_date': '2021-05-14',
-                'duration_ms': 178000,
-                'popularity': 87,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 8,
-                'title': 'Levitating',
-                'artist': 'Dua Lipa',
-                'album': 'Future Nostalgia',
-                'release_date': '2020-03-27',
-                'duration_ms': 203000,
-                'popularity': 86,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 9,
-                'title': 'Stay',
-                'artist': 'The Kid LAROI, Justin Bieber',
-                'album': 'Stay',
-                'release_date': '2021-07-09',
-                'duration_ms': 141000,
-                'popularity': 85,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            },
-            {
-                'rank': 10,
-                'title': 'Heat Waves',
-                'artist': 'Glass Animals',
-                'album': 'Dreamland',
-                'release_date': '2020-06-29',
-                'duration_ms': 238000,
-                'popularity': 84,
-                'spotify_url': 'https://open.spotify.com/track/mock',
-                'preview_url': None
-            }
-        ]
-        return mock_songs[:limit]
+        """Trending songs from the offline catalog (or mock data) when API is not available"""
+        # Imported on first fallback only: the catalog needs numpy
+        from offline_catalog import offline_trending
+        return offline_trending(limit)
     
     def search_song(self, query, limit=5):
         """Search for songs by query"""
         try:
             if not self.spotify:
-                return []
+                return self._offline_search(query, limit)
             
             results = self.spotify.search(q=query, type='track', limit=limit)
             songs = []
@@ -193,6 +100,7 @@ class MusicDataService:
                 song_info = {
                     'title': track['name'],
                     'artist': ', '.join([artist['name'] for artist in track['artists']]),
+                    'artists': [artist['name'] for artist in track['artists']],
                     'album': track['album']['name'],
                     'release_date': track['album']['release_date'],
                     'duration_ms': track['duration_ms'],
@@ -206,7 +114,12 @@ class MusicDataService:
             
         except Exception as e:
             print(f"Error searching songs: {e}")
-            return []
+            return self._offline_search(query, limit)
+    
+    def _offline_search(self, query, limit=5):
+        """Search the offline catalog when Spotify can't be reached"""
+        from offline_catalog import offline_search
+        return offline_search(query, limit)
     
     def get_artist_info(self, artist_name):
         """Get detailed information about an artist"""
@@ -214,6 +127,10 @@ class MusicDataService:
             if not self.spotify:
                 return self._get_mock_artist_info(artist_name)
             
+            cached = self._artist_cache.get(artist_name.lower())
+            if cached:
+                return cached
+            
             results = self.spotify.search(q=artist_name, type='artist', limit=1)
             
             if results['artists']['items']:
@@ -248,6 +165,7 @@ class MusicDataService:
                     ]
                 }
                 
+                self._artist_cache.set(artist_name.lower(), artist_info)
                 return artist_info
             else:
                 return self._get_mock_artist_info(artist_name)
@@ -256,8 +174,19 @@ class MusicDataService:
             print(f"Error getting artist info: {e}")
             return self._get_mock_artist_info(artist_name)
     
+    def prefetch_artists(self, songs):
+        """Warm the artist cache for the artists of listed songs in the background"""
+        if not self._prefetcher or not self.spotify:
+            return
+        
+        self._prefetcher.submit_artists(songs, lambda name: name.lower() in self._artist_cache)
+    
     def _get_mock_artist_info(self, artist_name):
-        """Mock artist info when API is not available"""
+        """Artist info from the offline catalog, or mock info when API is not available"""
+        from offline_catalog import offline_artist_info
+        artist_info = offline_artist_info(artist_name)
+        if artist_info:
+            return artist_info
         return {
             'name': artist_name,
             'followers': 1000000,
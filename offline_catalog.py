@@ -0,0 +1,423 @@
+"""Memory-mapped offline track catalog used when Spotify is unavailable.
+
+The catalog is a single file: a JSON header followed by 64-byte aligned
+sections holding NumPy columns (popularity, duration, release date, artist
+index) and offsets-indexed UTF-8 string tables. Opening it only parses the
+header; every column is a zero-copy view of one read-only ``mmap``, so load
+time is independent of the catalog size and all worker processes share the
+same pages in the OS page cache.
+
+Build one from CSV or JSON lines (title, artist, album, release_date,
+duration_ms, popularity and optionally id):
+
+    python offline_catalog.py build tracks.csv --output data/offline_catalog.bin
+"""
+import argparse
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it the offline catalog is unavailable
+    np = None
+
+from artist_index import ArtistIndex
+
+MAGIC = b'MUSICCAT'
+ALIGNMENT = 64
+
+
+class _StringTable:
+    """Sequence view of the strings in an offsets-indexed UTF-8 blob"""
+
+    def __init__(self, catalog, name):
+        self._buffer = catalog._mmap
+        self._offsets = catalog._columns[f'{name}_offsets']
+        self._start = catalog._sections[f'{name}_blob']
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start = self._start + int(self._offsets[i])
+        end = self._start + int(self._offsets[i + 1])
+        return self._buffer[start:end].decode('utf-8')
+
+
+class OfflineCatalog:
+    """Read-only track catalog with vectorized top-k, filter and search queries"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an offline catalog")
+        (header_size,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_size])
+
+        self.track_count = header['tracks']
+        self._sections = {name: section['offset'] for name, section in header['sections'].items()}
+        self._columns = {
+            name: np.frombuffer(self._mmap, dtype=section['dtype'], count=section['count'],
+                                offset=section['offset'])
+            for name, section in header['sections'].items()
+            if not name.endswith('_blob')
+        }
+        self._search_end = self._sections['search_blob'] + header['sections']['search_blob']['count']
+
+        self.titles = _StringTable(self, 'title')
+        self.albums = _StringTable(self, 'album')
+        self.track_ids = _StringTable(self, 'track_id')
+        self.artists = _StringTable(self, 'artist')
+        self._artist_keys = _StringTable(self, 'artist_key')
+
+    def __len__(self):
+        return self.track_count
+
+    def top_tracks(self, limit=10, mask=None):
+        """Most popular tracks, optionally restricted by a boolean mask or row indices"""
+        if mask is None:
+            # Precomputed at build time, so the unfiltered chart is a slice
+            return [self.track(int(row)) for row in self._columns['by_popularity'][:limit]]
+        popularity = self._columns['popularity']
+        rows = np.asarray(mask)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        scores = popularity[rows]
+        if len(rows) > limit:
+            top = np.argpartition(-scores.astype(np.int16), limit - 1)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores.astype(np.int16), kind='stable')
+        return [self.track(int(row)) for row in rows[order]]
+
+    def trending(self, limit=10, released_after=None):
+        """Fallback trending chart: the most popular tracks, optionally recent ones only"""
+        mask = None
+        if released_after:
+            mask = self._columns['release_date'] >= self._date_number(released_after)
+        return [{'rank': rank, **song} for rank, song in enumerate(self.top_tracks(limit, mask), 1)]
+
+    def search(self, query, limit=5, max_candidates=50000):
+        """Most popular tracks whose title or artist contains the normalized query"""
+        needle = ArtistIndex.normalize(query).encode('utf-8')
+        if not needle:
+            return []
+
+        base = self._sections['search_blob']
+        positions = []
+        position = self._mmap.find(needle, base, self._search_end)
+        while position != -1 and len(positions) < max_candidates:
+            positions.append(position - base)
+            # Continue after this track's newline so each track matches at most once
+            position = self._mmap.find(needle, self._mmap.find(b'\n', position) + 1, self._search_end)
+        if not positions:
+            return []
+        rows = np.searchsorted(self._columns['search_offsets'], np.array(positions, dtype='<u8'), side='right') - 1
+        return self.top_tracks(limit, rows.astype(np.int64))
+
+    def find_artist(self, name):
+        """Index of the artist with this normalized name, or None"""
+        key = ArtistIndex.normalize(name)
+        position = bisect.bisect_left(self._artist_keys, key)
+        if position < len(self._artist_keys) and self._artist_keys[position] == key:
+            return int(self._columns['artist_key_ids'][position])
+        return None
+
+    def artist_info(self, name, top_limit=5, album_limit=5):
+        """Artist summary built from the artist's tracks in the catalog, or None"""
+        artist = self.find_artist(name)
+        if artist is None:
+            return None
+
+        rows = np.flatnonzero(self._columns['artist'] == artist)
+        top_tracks = self.top_tracks(top_limit, rows)
+
+        album_rows = {}
+        for row in rows[np.argsort(-self._columns['release_date'][rows].astype(np.int64), kind='stable')]:
+            album_rows.setdefault(self.albums[int(row)], []).append(int(row))
+        albums = [
+            {
+                'name': album,
+                'release_date': self._date_string(self._columns['release_date'][album_tracks[0]]),
+                'total_tracks': len(album_tracks)
+            }
+            for album, album_tracks in list(album_rows.items())[:album_limit]
+        ]
+
+        return {
+            'name': self.artists[artist],
+            'followers': 0,
+            'popularity': int(self._columns['popularity'][rows].max()),
+            'genres': [],
+            'spotify_url': 'https://open.spotify.com/search/' + self.artists[artist].replace(' ', '%20'),
+            'images': [],
+            'top_tracks': [
+                {'name': track['title'], 'album': track['album'], 'popularity': track['popularity']}
+                for track in top_tracks
+            ],
+            'albums': albums
+        }
+
+    def track(self, row):
+        """A single track in the service's song format"""
+        track_id = self.track_ids[row]
+        return {
+            'title': self.titles[row],
+            'artist': self.artists[int(self._columns['artist'][row])],
+            'album': self.albums[row],
+            'release_date': self._date_string(self._columns['release_date'][row]),
+            'duration_ms': int(self._columns['duration_ms'][row]),
+            'popularity': int(self._columns['popularity'][row]),
+            'spotify_url': f'https://open.spotify.com/track/{track_id}' if track_id else None,
+            'preview_url': None
+        }
+
+    @staticmethod
+    def _date_number(date):
+        """'2023-01-13' (or '2023') as 20230113, the stored release date format"""
+        parts = [int(part) for part in str(date).split('-')[:3] if part.isdigit()]
+        parts += [0] * (3 - len(parts))
+        return parts[0] * 10000 + parts[1] * 100 + parts[2] if parts[0] else 0
+
+    @staticmethod
+    def _date_string(number):
+        number = int(number)
+        if not number:
+            return ''
+        year, month, day = number // 10000, number // 100 % 100, number % 100
+        if not month:
+            return f'{year:04d}'
+        return f'{year:04d}-{month:02d}-{day:02d}' if day else f'{year:04d}-{month:02d}'
+
+
+def write_catalog(tracks, path):
+    """Write tracks (dicts with title, artist, album, release_date, duration_ms,
+    popularity and optionally id) to a catalog file; returns the track count"""
+    if np is None:
+        raise RuntimeError("numpy is required to build the offline catalog")
+
+    artist_ids = {}
+    columns = {name: [] for name in ('popularity', 'duration_ms', 'release_date', 'artist')}
+    strings = {name: [] for name in ('title', 'album', 'track_id', 'search')}
+    for track in tracks:
+        artist = track.get('artist') or 'Unknown Artist'
+        artist_id = artist_ids.setdefault(artist, len(artist_ids))
+        columns['popularity'].append(int(track.get('popularity') or 0))
+        columns['duration_ms'].append(int(track.get('duration_ms') or 0))
+        columns['release_date'].append(OfflineCatalog._date_number(track.get('release_date') or ''))
+        columns['artist'].append(artist_id)
+        strings['title'].append(track.get('title') or '')
+        strings['album'].append(track.get('album') or '')
+        strings['track_id'].append(track.get('id') or '')
+        # Newline-terminated so a search match never spans two tracks
+        strings['search'].append(ArtistIndex.normalize(f"{track.get('title') or ''} {artist}") + '\n')
+
+    artists = list(artist_ids)
+    artist_keys = sorted((ArtistIndex.normalize(name), index) for index, name in enumerate(artists))
+    strings['artist'] = artists
+    strings['artist_key'] = [key for key, _ in artist_keys]
+
+    arrays = {
+        'popularity': np.array(columns['popularity'], dtype='<u1'),
+        'duration_ms': np.array(columns['duration_ms'], dtype='<u4'),
+        'release_date': np.array(columns['release_date'], dtype='<u4'),
+        'artist': np.array(columns['artist'], dtype='<u4'),
+        'artist_key_ids': np.array([index for _, index in artist_keys], dtype='<u4')
+    }
+    arrays['by_popularity'] = np.argsort(-arrays['popularity'].astype(np.int16), kind='stable').astype('<u4')
+    for name, values in strings.items():
+        encoded = [value.encode('utf-8') for value in values]
+        arrays[f'{name}_offsets'] = np.concatenate(
+            [[0], np.cumsum([len(value) for value in encoded], dtype=np.uint64)]
+        ).astype('<u8')
+        arrays[f'{name}_blob'] = np.frombuffer(b''.join(encoded), dtype='<u1')
+
+    # Section offsets depend on the header size, so lay the file out until they settle
+    header_size = 0
+    while True:
+        offset = _align(len(MAGIC) + 8 + header_size)
+        sections = {}
+        for name, array in arrays.items():
+            sections[name] = {'dtype': array.dtype.str, 'count': len(array), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header = json.dumps({'version': 1, 'tracks': len(columns['artist']), 'sections': sections}).encode('utf-8')
+        if len(header) <= header_size:
+            break
+        header_size = len(header) + 256
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', header_size) + header.ljust(header_size))
+        for name, array in arrays.items():
+            f.write(b'\0' * (sections[name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return len(columns['artist'])
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+_catalog = None
+_catalog_loaded = False
+_catalog_lock = threading.Lock()
+
+
+def get_offline_catalog():
+    """The process-wide offline catalog, opened on first use (None if unavailable)"""
+    global _catalog, _catalog_loaded
+    if not _catalog_loaded:
+        with _catalog_lock:
+            if not _catalog_loaded:
+                path = os.getenv('OFFLINE_CATALOG_PATH', 'data/offline_catalog.bin')
+                if np is not None and os.path.exists(path):
+                    try:
+                        _catalog = OfflineCatalog(path)
+                        print(f"✅ Opened offline catalog with {len(_catalog)} tracks")
+                    except Exception as e:
+                        print(f"⚠️ Could not open offline catalog: {e}")
+                _catalog_loaded = True
+    return _catalog
+
+
+# Trending songs served when Spotify is unavailable and no catalog is installed
+FALLBACK_TRENDING = [
+    {
+        'rank': 1, 'title': 'Flowers', 'artist': 'Miley Cyrus',
+        'album': 'Endless Summer Vacation', 'popularity': 95,
+        'release_date': '2023-01-13', 'duration_ms': 200000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 2, 'title': 'Anti-Hero', 'artist': 'Taylor Swift',
+        'album': 'Midnights', 'popularity': 94,
+        'release_date': '2022-10-21', 'duration_ms': 201000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 3, 'title': 'As It Was', 'artist': 'Harry Styles',
+        'album': 'Harry\'s House', 'popularity': 93,
+        'release_date': '2022-04-01', 'duration_ms': 167000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 4, 'title': 'Heat Waves', 'artist': 'Glass Animals',
+        'album': 'Dreamland', 'popularity': 92,
+        'release_date': '2020-08-07', 'duration_ms': 238000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 5, 'title': 'Blinding Lights', 'artist': 'The Weeknd',
+        'album': 'After Hours', 'popularity': 91,
+        'release_date': '2019-11-29', 'duration_ms': 200000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 6, 'title': 'Good 4 U', 'artist': 'Olivia Rodrigo',
+        'album': 'SOUR', 'popularity': 90,
+        'release_date': '2021-05-14', 'duration_ms': 178000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 7, 'title': 'Stay', 'artist': 'The Kid LAROI, Justin Bieber',
+        'album': 'F*CK LOVE 3: OVER YOU', 'popularity': 89,
+        'release_date': '2021-07-09', 'duration_ms': 141000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 8, 'title': 'Bad Habit', 'artist': 'Steve Lacy',
+        'album': 'Gemini Rights', 'popularity': 88,
+        'release_date': '2022-06-29', 'duration_ms': 216000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 9, 'title': 'Unholy', 'artist': 'Sam Smith (feat. Kim Petras)',
+        'album': 'Unholy', 'popularity': 87,
+        'release_date': '2022-09-22', 'duration_ms': 156000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    },
+    {
+        'rank': 10, 'title': 'About Damn Time', 'artist': 'Lizzo',
+        'album': 'Special', 'popularity': 86,
+        'release_date': '2022-04-14', 'duration_ms': 192000,
+        'spotify_url': 'https://open.spotify.com/track/example', 'preview_url': None
+    }
+]
+
+
+def offline_trending(limit=10):
+    """Trending songs from the offline catalog, or the fallback list without one"""
+    catalog = get_offline_catalog()
+    if catalog:
+        return catalog.trending(limit)
+    return [dict(song) for song in FALLBACK_TRENDING[:limit]]
+
+
+def offline_search(query, limit=5):
+    """Songs matching a query in the offline catalog (none without one)"""
+    catalog = get_offline_catalog()
+    return catalog.search(query, limit) if catalog else []
+
+
+def offline_artist_info(artist_name):
+    """Artist info from the offline catalog, or None"""
+    catalog = get_offline_catalog()
+    return catalog.artist_info(artist_name) if catalog else None
+
+
+def _read_tracks(path):
+    """Yield track dicts from a CSV file or JSON lines"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the offline track catalog")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build = subcommands.add_parser('build', help="build a catalog from CSV or JSON lines")
+    build.add_argument('input')
+    build.add_argument('--output', default=os.getenv('OFFLINE_CATALOG_PATH', 'data/offline_catalog.bin'))
+    query = subcommands.add_parser('query', help="time trending, search and artist queries")
+    query.add_argument('text')
+    query.add_argument('--catalog', default=os.getenv('OFFLINE_CATALOG_PATH', 'data/offline_catalog.bin'))
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        count = write_catalog(_read_tracks(args.input), args.output)
+        print(f"✅ Wrote {count} tracks to {args.output} in {time.perf_counter() - started:.1f}s")
+        return
+
+    started = time.perf_counter()
+    catalog = OfflineCatalog(args.catalog)
+    print(f"Opened {len(catalog)} tracks in {(time.perf_counter() - started) * 1000:.2f} ms")
+    for label, run in [
+        ('trending', lambda: catalog.trending(10)),
+        ('search', lambda: catalog.search(args.text, 5)),
+        ('artist', lambda: catalog.artist_info(args.text))
+    ]:
+        started = time.perf_counter()
+        result = run()
+        print(f"\n{label} ({(time.perf_counter() - started) * 1000:.2f} ms):")
+        print(json.dumps(result, ensure_ascii=False, indent=2)[:1000])
+
+
+if __name__ == '__main__':
+    main()
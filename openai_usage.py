@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+# USD per million tokens: (prompt, cached prompt, completion)
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-3.5-turbo': (0.50, 0.50, 1.50),
+    'gpt-3.5-turbo-0125': (0.50, 0.50, 1.50)
+}
+# Used for models missing from the table, so unknown spend is never counted as free
+DEFAULT_PRICE = (0.50, 0.50, 1.50)
+
+
+class OpenAIUsage:
+    """Per-call OpenAI token accounting with a rolling spend budget.
+
+    Every completion's ``usage`` is recorded per route and model (prompt,
+    completion and cached prompt tokens, plus estimated cost). Spend over the
+    last ``window`` seconds determines the budget tier callers should use:
+    ``normal`` below ``downgrade_at`` of the budget, ``cheap`` (smaller,
+    cheaper completions) until the budget is used up, then ``exhausted``
+    (cached or fallback results only). A budget of 0 disables the limit.
+    """
+
+    def __init__(self, budget_usd=0, window=3600, downgrade_at=0.7):
+        self.budget_usd = budget_usd
+        self.window = window
+        self.downgrade_at = downgrade_at
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: defaultdict(int))
+        self._recent = deque()
+        self._recent_cost = 0.0
+        self._downgraded = defaultdict(int)
+
+    def record(self, route, model, usage):
+        """Record the usage of one completion; returns its estimated cost in USD"""
+        if usage is None:
+            return 0.0
+        prompt = getattr(usage, 'prompt_tokens', 0) or 0
+        completion = getattr(usage, 'completion_tokens', 0) or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+
+        prompt_price, cached_price, completion_price = MODEL_PRICES.get(model, DEFAULT_PRICE)
+        cost = ((prompt - cached) * prompt_price + cached * cached_price + completion * completion_price) / 1e6
+
+        now = time.monotonic()
+        with self._lock:
+            totals = self._totals[(route, model)]
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt
+            totals['completion_tokens'] += completion
+            totals['cached_tokens'] += cached
+            totals['cost_usd'] += cost
+            self._recent.append((now, cost))
+            self._recent_cost += cost
+            self._expire(now)
+        return cost
+
+    def tier(self):
+        """'normal', 'cheap' or 'exhausted' for the spend in the current window"""
+        if not self.budget_usd:
+            return 'normal'
+        return self._tier_for(self.window_spend())
+
+    def record_downgrade(self, route, tier):
+        """Count a request that was served by a cheaper completion or a fallback"""
+        with self._lock:
+            self._downgraded[(route, tier)] += 1
+
+    def _tier_for(self, spent):
+        if not self.budget_usd or spent < self.budget_usd * self.downgrade_at:
+            return 'normal'
+        return 'exhausted' if spent >= self.budget_usd else 'cheap'
+
+    def window_spend(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._recent_cost
+
+    def _expire(self, now):
+        while self._recent and now - self._recent[0][0] > self.window:
+            _, cost = self._recent.popleft()
+            self._recent_cost -= cost
+        if not self._recent:
+            self._recent_cost = 0.0
+
+    def stats(self):
+        """Usage totals per route and model, with the current budget state"""
+        spent = self.window_spend()
+        with self._lock:
+            return {
+                'routes': [
+                    {'route': route, 'model': model, **{name: round(value, 6) for name, value in totals.items()}}
+                    for (route, model), totals in sorted(self._totals.items())
+                ],
+                'window_seconds': self.window,
+                'window_spend_usd': round(spent, 6),
+                'budget_usd': self.budget_usd,
+                'tier': self._tier_for(spent)
+            }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        spent = self.window_spend()
+        lines = []
+        with self._lock:
+            for name, help_text in (
+                ('calls', 'OpenAI completions made'),
+                ('prompt_tokens', 'Prompt tokens sent to OpenAI'),
+                ('completion_tokens', 'Completion tokens received from OpenAI'),
+                ('cached_tokens', 'Prompt tokens served from the OpenAI prompt cache'),
+                ('cost_usd', 'Estimated OpenAI spend in USD')
+            ):
+                metric = f'openai_{name}_total'
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                for (route, model), totals in sorted(self._totals.items()):
+                    lines.append(f'{metric}{{route="{route}",model="{model}"}} {totals[name]:g}')
+            lines += ['# HELP openai_downgraded_requests_total Requests served below the normal budget tier',
+                      '# TYPE openai_downgraded_requests_total counter']
+            for (route, tier), count in sorted(self._downgraded.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+                lines.append(f'openai_downgraded_requests_total{{route="{route}",tier="{tier}"}} {count}')
+        lines += [
+            '# HELP openai_window_spend_usd Estimated OpenAI spend in the rolling budget window',
+            '# TYPE openai_window_spend_usd gauge',
+            f'openai_window_spend_usd {spent:g}',
+            '# HELP openai_budget_usd Spend budget for the rolling window (0 = unlimited)',
+            '# TYPE openai_budget_usd gauge',
+            f'openai_budget_usd {self.budget_usd:g}'
+        ]
+        return '\n'.join(lines) + '\n'
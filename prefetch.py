@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+    """Low-priority background warming of likely follow-up lookups.
+
+    Work runs on its own small pool so it never occupies threads needed by
+    foreground requests. It is bounded by an upstream budget (fetches per
+    window) and shed under load: keys are dropped when too many are already
+    queued, and queued keys that waited longer than ``max_age`` are skipped.
+    """
+
+    def __init__(self, fetch, budget=30, window=60, max_pending=10, max_age=10, workers=1):
+        self.fetch = fetch
+        self.budget = budget
+        self.window = window
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._spent = []
+
+    def submit(self, keys):
+        """Queue keys for prefetching; returns how many were accepted"""
+        accepted = 0
+        now = time.monotonic()
+        with self._lock:
+            self._spent = [t for t in self._spent if now - t < self.window]
+            for key in keys:
+                if key in self._pending:
+                    continue
+                if len(self._pending) >= self.max_pending or len(self._spent) >= self.budget:
+                    break
+                self._pending.add(key)
+                self._spent.append(now)
+                self._executor.submit(self._run, key, now)
+                accepted += 1
+        return accepted
+
+    def submit_artists(self, songs, cached):
+        """Queue the artists of listed songs whose info isn't cached yet.
+
+        ``cached(name)`` tells whether an artist needs no fetch. Returns how
+        many artists were accepted.
+        """
+        names = []
+        for song in songs:
+            for name in song_artists(song):
+                if name not in names and not cached(name):
+                    names.append(name)
+        return self.submit(names)
+
+    def _run(self, key, queued_at):
+        try:
+            if time.monotonic() - queued_at <= self.max_age:
+                self.fetch(key)
+        except Exception as e:
+            print(f"⚠️ Prefetch failed for {key}: {str(e)[:50]}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+
+def song_artists(song):
+    """Individual artist names of a song in our format.
+
+    Songs formatted from Spotify tracks list them in ``artists``; mock and
+    catalog songs only have the ``artist`` credit, which is taken whole since
+    artist names may themselves contain commas.
+    """
+    if song.get('artists'):
+        return list(song['artists'])
+    return [song['artist']] if song.get('artist') else []
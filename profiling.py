@@ -0,0 +1,335 @@
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# The capture of the request being handled, if it is being profiled
+_current = contextvars.ContextVar('profile', default=None)
+
+
+def profiling_enabled():
+    """True when requests may be profiled (a sampling rate or a trigger token is set)"""
+    return float(os.getenv('PROFILE_SAMPLE_RATE', '0')) > 0 or bool(os.getenv('PROFILE_TOKEN'))
+
+
+class Capture:
+    """Stack samples and upstream spans collected for one request"""
+
+    def __init__(self, method, path, trigger):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.stacks = Counter()
+        self.spans = []
+        self.truncated = False
+        self.finished = False
+        # Threads working for this request: the request thread plus pool workers
+        self.threads = {threading.get_ident()}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, duration, error=None):
+        with self._lock:
+            self.spans.append({
+                'name': name,
+                'thread': threading.current_thread().name,
+                'start_ms': round((start - self._start) * 1000, 3),
+                'duration_ms': round(duration * 1000, 3),
+                'error': error
+            })
+
+    def finish(self):
+        with self._lock:
+            self.finished = True
+            self.duration = time.perf_counter() - self._start
+
+    def add_sample(self, stack):
+        """Count one sampled stack; False once the capture has finished"""
+        with self._lock:
+            if self.finished:
+                return False
+            self.stacks[stack] += 1
+            return True
+
+    def snapshot(self):
+        """(summary, stacks by count, spans), consistent with each other"""
+        with self._lock:
+            return self.summary(), self.stacks.most_common(), list(self.spans)
+
+    def summary(self):
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span['name'], {'calls': 0, 'total_ms': 0.0})
+            total['calls'] += 1
+            total['total_ms'] = round(total['total_ms'] + span['duration_ms'], 3)
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'trigger': self.trigger,
+            'started_at': self.started_at,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'samples': sum(self.stacks.values()),
+            'truncated': self.truncated,
+            'upstream': totals
+        }
+
+
+@contextmanager
+def span(name):
+    """Time a block as an upstream span of the request being profiled, if any"""
+    capture = _current.get()
+    if capture is None:
+        yield
+        return
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        capture.add_span(name, start, time.perf_counter() - start, error)
+
+
+class TracedClient:
+    """Proxy for an API client that records each method call as a span.
+
+    Attribute chains are followed, so ``openai.chat.completions.create`` is
+    recorded under that full name.
+    """
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        name = f"{self._name}.{attr}"
+        if callable(value):
+            def call(*args, **kwargs):
+                if _current.get() is None:
+                    return value(*args, **kwargs)
+                with span(name):
+                    return value(*args, **kwargs)
+            return call
+        if attr.startswith('_') or isinstance(value, (str, bytes, int, float, bool, type(None), dict, list, tuple)):
+            return value
+        return TracedClient(value, name)
+
+
+def traced_client(client, name):
+    """Wrap an API client to record spans, or return it unchanged when profiling is off"""
+    if client is None or not profiling_enabled():
+        return client
+    return TracedClient(client, name)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Thread pool whose tasks run in the submitter's context, so work done for
+    a profiled request is sampled and its spans recorded with the request"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, self._run, fn, args, kwargs)
+
+    @staticmethod
+    def _run(fn, args, kwargs):
+        capture = _current.get()
+        if capture is None:
+            return fn(*args, **kwargs)
+        thread = threading.get_ident()
+        capture.threads.add(thread)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            capture.threads.discard(thread)
+
+
+def thread_pool(**kwargs):
+    """A thread pool that carries profiling context when profiling is on"""
+    executor_class = ContextThreadPoolExecutor if profiling_enabled() else ThreadPoolExecutor
+    return executor_class(**kwargs)
+
+
+class Profiler:
+    """Opt-in sampling profiler for Flask requests.
+
+    A request is profiled when it carries the ``X-Profile`` header with the
+    configured token, or at random with probability ``sample_rate``. While any
+    request is being profiled, one background thread samples the stacks of
+    the threads working for it every ``interval`` seconds (up to
+    ``max_seconds``). Each capture is written to ``directory`` as collapsed
+    stacks (``<id>.folded``, for flamegraph.pl or speedscope) and a JSON
+    summary with upstream span timings; only the newest ``keep`` are kept.
+    Nothing is installed on the app when both the rate and token are unset.
+    """
+
+    HEADER = 'X-Profile'
+
+    def __init__(self, directory=None, sample_rate=None, token=None, interval=None,
+                 max_seconds=None, keep=None):
+        self.directory = directory or os.getenv('PROFILE_DIR', 'data/profiles')
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.token = token if token is not None else os.getenv('PROFILE_TOKEN', '')
+        self.interval = interval or float(os.getenv('PROFILE_INTERVAL', '0.005'))
+        self.max_seconds = max_seconds or float(os.getenv('PROFILE_MAX_SECONDS', '30'))
+        self.keep = keep or int(os.getenv('PROFILE_KEEP', '100'))
+        self.enabled = self.sample_rate > 0 or bool(self.token)
+        self._captures = set()
+        self._condition = threading.Condition()
+        self._sampler = None
+        self._write_lock = threading.Lock()
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        from flask import g, request
+
+        @app.before_request
+        def start_profile():
+            if request.path.startswith('/debug/profiles'):
+                return
+            if self.authorized(request.headers.get(self.HEADER, '')):
+                trigger = 'header'
+            elif self.sample_rate and random.random() < self.sample_rate:
+                trigger = 'sample'
+            else:
+                return
+            g.profile = self.start(request.method, request.path, trigger)
+
+        @app.after_request
+        def tag_profile(response):
+            capture = g.get('profile')
+            if capture:
+                capture.status = response.status_code
+                response.headers['X-Profile-Id'] = capture.id
+            return response
+
+        @app.teardown_request
+        def stop_profile(exc):
+            capture = g.pop('profile', None)
+            if capture:
+                self.stop(capture)
+
+    def authorized(self, token):
+        """Whether a request-supplied token matches the configured one"""
+        return bool(self.token) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def start(self, method, path, trigger):
+        capture = Capture(method, path, trigger)
+        capture.context_token = _current.set(capture)
+        with self._condition:
+            self._captures.add(capture)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+                self._sampler.start()
+            self._condition.notify()
+        return capture
+
+    def stop(self, capture):
+        # Finished under the sampler's condition so no sample lands while it is written
+        with self._condition:
+            capture.finish()
+            self._captures.discard(capture)
+        try:
+            _current.reset(capture.context_token)
+        except ValueError:
+            # Torn down from another context (streamed responses); nothing to restore
+            pass
+        try:
+            self._write(capture)
+        except Exception as e:
+            print(f"⚠️ Could not write profile {capture.id}: {e}")
+
+    def _sample(self):
+        me = threading.get_ident()
+        while True:
+            with self._condition:
+                while not self._captures:
+                    self._condition.wait()
+                captures = list(self._captures)
+
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            now = time.perf_counter()
+            for capture in captures:
+                if capture.finished:
+                    continue
+                if now - capture._start > self.max_seconds:
+                    capture.truncated = True
+                    continue
+                for thread in list(capture.threads):
+                    frame = frames.get(thread)
+                    if frame is not None and thread != me:
+                        if not capture.add_sample(self._fold(frame, names.get(thread, str(thread)))):
+                            break
+            del frames
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _fold(frame, thread_name):
+        """One sample as a collapsed stack: thread;outermost;...;innermost"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join([thread_name] + stack[::-1])
+
+    def _write(self, capture):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, capture.id)
+        summary, stacks, spans = capture.snapshot()
+        with open(f"{base}.folded", 'w', encoding='utf-8') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks)
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump({**summary, 'interval_ms': self.interval * 1000, 'spans': spans}, f)
+
+        # Rotate: keep only the newest captures (ids sort by time)
+        with self._write_lock:
+            ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+            for old in ids[:-self.keep]:
+                for ext in ('.json', '.folded'):
+                    try:
+                        os.remove(os.path.join(self.directory, old + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def recent(self, limit=50):
+        """Summaries of the newest captures, newest first"""
+        try:
+            names = sorted((n for n in os.listdir(self.directory) if n.endswith('.json')), reverse=True)
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for name in names[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profile.pop('spans', None)
+            profiles.append(profile)
+        return profiles
+
+    def path(self, profile_id, ext):
+        """File of a capture, or None for unknown or malformed ids"""
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith('.'):
+            return None
+        path = os.path.join(self.directory, profile_id + ext)
+        return path if os.path.exists(path) else None
@@ -1,45 +1,189 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import requests
 import os
+import json
 from dotenv import load_dotenv
-import openai
-from openai import OpenAI
 import ssl
-import certifi
-import urllib3
+import threading
+import atexit
+import itertools
+import time
+from collections import deque
+from artist_index import ArtistIndex
+from cache import TTLCache
+from fields import format_fields, merge_fields, parse_fields
+from openai_usage import OpenAIUsage
+from prefetch import Prefetcher
+from profiling import thread_pool, traced_client
+from recommender import TrackRecommender
 
-# Comprehensive SSL fix for macOS
-try:
-    # Set certificate paths
-    cert_file = certifi.where()
-    os.environ['SSL_CERT_FILE'] = cert_file
-    os.environ['REQUESTS_CA_BUNDLE'] = cert_file
-    os.environ['CURL_CA_BUNDLE'] = cert_file
-    
-    # Create SSL context that doesn't verify certificates as a fallback
-    ssl._create_default_https_context = ssl._create_unverified_context
-    
-    # Disable SSL warnings
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    
-except Exception as e:
-    print(f"⚠️ SSL configuration warning: {e}")
+# spotipy, openai and certifi are heavy to import; they are loaded when the
+# Spotify and OpenAI clients are first used, so processes that never touch
+# them (and cold starts) don't pay for them.
+
+_ssl_configured = False
+
+
+def _configure_ssl():
+    """Comprehensive SSL fix for macOS, applied once before the first API client is built"""
+    global _ssl_configured
+    if _ssl_configured:
+        return
+    _ssl_configured = True
+    
+    try:
+        import certifi
+        import urllib3
+        
+        # Set certificate paths
+        cert_file = certifi.where()
+        os.environ['SSL_CERT_FILE'] = cert_file
+        os.environ['REQUESTS_CA_BUNDLE'] = cert_file
+        os.environ['CURL_CA_BUNDLE'] = cert_file
+        
+        # Create SSL context that doesn't verify certificates as a fallback
+        ssl._create_default_https_context = ssl._create_unverified_context
+        
+        # Disable SSL warnings
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        
+    except Exception as e:
+        print(f"⚠️ SSL configuration warning: {e}")
 
 load_dotenv()
 
 class RealMusicService:
     """Service to fetch real music data from Spotify and generate AI lyrics"""
     
+    # Spotify returns at most 100 playlist items per request
+    PLAYLIST_PAGE_SIZE = 100
+    # Spotify's several-artists endpoint accepts up to 50 IDs per request
+    ARTISTS_BATCH_SIZE = 50
+    # Spotify track fields behind each field of our song format, requested through
+    # the playlist `fields` filter so unused data (markets, images) isn't downloaded
+    TRACK_FIELDS = {
+        'title': 'name',
+        'artist': 'artists(id,name)',
+        'artists': 'artists(id,name)',
+        'album': 'album(name)',
+        'release_date': 'album(release_date)',
+        'duration_ms': 'duration_ms',
+        'popularity': 'popularity',
+        'spotify_url': 'external_urls(spotify)',
+        'preview_url': 'preview_url',
+        'image_url': 'album(images(url))'
+    }
+    # Always fetched: chart history and recommendations are built from these
+    REQUIRED_TRACK_FIELDS = ('title', 'artist', 'release_date', 'duration_ms', 'popularity', 'spotify_url')
+    
     def __init__(self):
-        self.spotify = None
-        self.openai_client = None
-        self._setup_spotify()
-        self._setup_openai()
+        # Clients are set up on first use; see the spotify/openai_client properties
+        self._spotify = None
+        self._openai_client = None
+        self._spotify_ready = False
+        self._openai_ready = False
+        self._spotify_lock = threading.Lock()
+        self._openai_lock = threading.Lock()
+        # Token accounting for every completion, and the rolling spend budget
+        # that moves requests to cheaper completions or fallbacks as it runs out
+        self.openai_usage = OpenAIUsage(
+            budget_usd=float(os.getenv('OPENAI_BUDGET_USD', '0')),
+            window=float(os.getenv('OPENAI_BUDGET_WINDOW', '3600')),
+            downgrade_at=float(os.getenv('OPENAI_BUDGET_DOWNGRADE_AT', '0.7'))
+        )
+        # Bounded pool for concurrent Spotify calls (pagination, fan-out)
+        self._spotify_concurrency = int(os.getenv('SPOTIFY_MAX_CONCURRENCY', '4'))
+        self._executor = thread_pool(
+            max_workers=self._spotify_concurrency,
+            thread_name_prefix='spotify'
+        )
+        # Persistent artist name -> Spotify ID index, filled from every artist payload
+        self.artist_index = ArtistIndex()
+        atexit.register(self.artist_index.save)
+        # Short-lived record of lookups that found nothing or failed, kept apart
+        # from positive results so bots replaying garbage queries cost nothing upstream
+        self._negative_cache = TTLCache(
+            maxsize=int(os.getenv('NEGATIVE_CACHE_SIZE', '5000')),
+            ttl=float(os.getenv('NEGATIVE_CACHE_TTL', '120'))
+        )
+        self._negative_error_ttl = float(os.getenv('NEGATIVE_CACHE_ERROR_TTL', '30'))
+        # Recently fetched artist info, warmed in the background after list replies
+        self._artist_cache = TTLCache(
+            maxsize=int(os.getenv('ARTIST_CACHE_SIZE', '1000')),
+            ttl=float(os.getenv('ARTIST_CACHE_TTL', '600'))
+        )
+        # Version of each lookup's data, renewed whenever it is refetched upstream,
+        # so caches derived from it (formatted chat replies) know when to rebuild
+        self._data_versions = TTLCache(maxsize=20000, ttl=24 * 3600)
+        self._version_counter = itertools.count(1)
+        # Last full trending chart per country, for pages rendered from recent data
+        self._trending_cache = TTLCache(maxsize=100, ttl=float(os.getenv('TRENDING_CACHE_TTL', '300')))
+        # Content-based recommendations over tracks seen in charts and searches
+        self.recommender = TrackRecommender(
+            max_tracks=int(os.getenv('RECOMMEND_MAX_TRACKS', '200000')),
+            rebuild_interval=float(os.getenv('RECOMMEND_REBUILD_INTERVAL', '30')),
+            ann_threshold=int(os.getenv('RECOMMEND_ANN_THRESHOLD', '100000'))
+        )
+        self._recommender_seeded = False
+        # Chart snapshot history, opened on first use (it needs numpy)
+        self._trending_history = None
+        self._history_lock = threading.Lock()
+        self._history_depth = int(os.getenv('TRENDING_HISTORY_DEPTH', '10'))
+        self._prefetcher = None
+        if os.getenv('PREFETCH_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self._prefetcher = Prefetcher(
+                self.get_artist_info,
+                budget=int(os.getenv('PREFETCH_BUDGET_PER_MINUTE', '30')),
+                max_pending=int(os.getenv('PREFETCH_MAX_PENDING', '10')),
+                max_age=float(os.getenv('PREFETCH_MAX_AGE', '10'))
+            )
+        # Optional near-duplicate cache for OpenAI lyrics and analysis completions
+        self.similarity_cache = None
+        if os.getenv('AI_SIMILARITY_CACHE', 'false').lower() in ('1', 'true', 'yes'):
+            from similarity_cache import SimilarityCache
+            self.similarity_cache = SimilarityCache(
+                threshold=float(os.getenv('AI_SIMILARITY_THRESHOLD', '0.9')),
+                maxsize=int(os.getenv('AI_SIMILARITY_CACHE_SIZE', '100000'))
+            )
+    
+    @property
+    def spotify(self):
+        """Spotify client, set up on first use (None when unavailable)"""
+        if not self._spotify_ready:
+            with self._spotify_lock:
+                if not self._spotify_ready:
+                    self._setup_spotify()
+                    # Calls are recorded as spans of profiled requests (no-op unless profiling is on)
+                    self._spotify = traced_client(self._spotify, 'spotify')
+                    self._spotify_ready = True
+        return self._spotify
+    
+    @property
+    def trending_history(self):
+        """Trending chart history store, opened on first use"""
+        if self._trending_history is None:
+            with self._history_lock:
+                if self._trending_history is None:
+                    from trending_history import TrendingHistory
+                    self._trending_history = TrendingHistory()
+        return self._trending_history
+    
+    @property
+    def openai_client(self):
+        """OpenAI client, set up on first use (None when unavailable)"""
+        if not self._openai_ready:
+            with self._openai_lock:
+                if not self._openai_ready:
+                    self._setup_openai()
+                    self._openai_client = traced_client(self._openai_client, 'openai')
+                    self._openai_ready = True
+        return self._openai_client
     
     def _setup_spotify(self):
         """Setup Spotify client with real credentials and SSL workaround"""
         try:
+            _configure_ssl()
+            import spotipy
+            from spotipy.oauth2 import SpotifyClientCredentials
+            
             client_id = os.getenv('SPOTIFY_CLIENT_ID')
             client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
             
@@ -72,14 +216,14 @@ class RealMusicService:
                             )
                         
                         # Create Spotify client
-                        self.spotify = spotipy.Spotify(
+                        self._spotify = spotipy.Spotify(
                             client_credentials_manager=client_credentials_manager,
                             requests_timeout=15,
                             retries=2
                         )
                         
                         # Test the connection with a simple search
-                        test_result = self.spotify.search(q='test', type='track', limit=1)
+                        test_result = self._spotify.search(q='test', type='track', limit=1)
                         if test_result:
                             print("✅ Spotify API connected successfully")
                             return
@@ -99,16 +243,19 @@ class RealMusicService:
                 
             else:
                 print("⚠️ Spotify credentials not found or invalid")
-                self.spotify = None
+                self._spotify = None
                 
         except Exception as e:
             print(f"❌ All Spotify connection attempts failed: {str(e)[:100]}...")
             print("🔧 Using fallback mode - trending songs will use high-quality curated data")
-            self.spotify = None
+            self._spotify = None
     
     def _setup_openai(self):
         """Setup OpenAI client for AI-generated content with robust error handling"""
         try:
+            _configure_ssl()
+            from openai import OpenAI
+            
             api_key = os.getenv('OPENAI_API_KEY')
             if api_key and api_key.startswith('sk-'):
                 # Try multiple client configurations
@@ -122,18 +269,19 @@ class RealMusicService:
                     try:
                         print(f"🔧 Trying OpenAI configuration {i}/3...")
                         
-                        self.openai_client = OpenAI(
+                        self._openai_client = OpenAI(
                             api_key=api_key,
                             **config
                         )
                         
                         # Quick connection test
-                        test_response = self.openai_client.chat.completions.create(
+                        test_response = self._openai_client.chat.completions.create(
                             model="gpt-4o-mini",
                             messages=[{"role": "user", "content": "test"}],
                             max_tokens=5,
                             timeout=10
                         )
+                        self.openai_usage.record('probe', "gpt-4o-mini", getattr(test_response, 'usage', None))
                         
                         if test_response and test_response.choices:
                             print(f"✅ OpenAI API connected successfully (config {i})")
@@ -150,100 +298,224 @@ class RealMusicService:
                 
             else:
                 print("⚠️ OpenAI API key not found or invalid")
-                self.openai_client = None
+                self._openai_client = None
                 
         except Exception as e:
             print(f"❌ Error setting up OpenAI: {e}")
             # Create a basic client anyway for potential use
             try:
+                from openai import OpenAI
                 if os.getenv('OPENAI_API_KEY', '').startswith('sk-'):
-                    self.openai_client = OpenAI(
+                    self._openai_client = OpenAI(
                         api_key=os.getenv('OPENAI_API_KEY'),
                         timeout=15.0,
                         max_retries=0
                     )
                     print("🔧 Created basic OpenAI client for fallback use")
                 else:
-                    self.openai_client = None
+                    self._openai_client = None
             except:
-                self.openai_client = None
+                self._openai_client = None
     
-    def get_trending_songs(self, limit=10, country='US'):
+    def get_trending_songs(self, limit=10, country='US', fields=None):
         """Get real trending songs from Spotify"""
+        trending_songs = list(self.iter_trending_songs(limit=limit, country=country, fields=fields))
+        print(f"✅ Fetched {len(trending_songs)} trending songs")
+        return trending_songs
+    
+    def iter_trending_songs(self, limit=10, country='US', fields=None):
+        """Yield trending songs in rank order as playlist pages arrive.
+        
+        Spotify caps ``playlist_tracks`` at 100 items per call, so large limits
+        are split into page offsets up front and fetched concurrently. Pages are
+        yielded as soon as every page before them has arrived. ``fields`` (song
+        field names) limits what is requested from Spotify; other song fields
+        may come back empty.
+        """
+        yielded = 0
         try:
             if not self.spotify:
-                return self._get_mock_trending_songs(limit)
-            
-            # Get featured playlists (trending content)
-            featured_playlists = self.spotify.featured_playlists(country=country, limit=1)
+                yield from self._get_mock_trending_songs(limit)
+                return
             
-            if not featured_playlists['playlists']['items']:
-                # Fallback to top 50 global playlist
-                results = self.spotify.search(q='Top 50 Global', type='playlist', limit=1)
-                if results['playlists']['items']:
-                    playlist_id = results['playlists']['items'][0]['id']
-                else:
-                    return self._get_mock_trending_songs(limit)
-            else:
-                playlist_id = featured_playlists['playlists']['items'][0]['id']
-            
-            # Get tracks from the playlist
-            tracks = self.spotify.playlist_tracks(playlist_id, limit=limit)
+            miss_key = self._miss_key('trending', country)
+            playlist_id = None
+            if miss_key not in self._negative_cache:
+                playlist_id = self._get_trending_playlist_id(country)
+                if not playlist_id:
+                    self._remember_miss(miss_key)
+            if not playlist_id:
+                self._forget_version('trending', country)
+                yield from self._get_mock_trending_songs(limit)
+                return
             
-            trending_songs = []
-            for idx, item in enumerate(tracks['items']):
-                if item['track'] and item['track']['name']:
-                    track = item['track']
-                    song_info = {
-                        'rank': idx + 1,
-                        'title': track['name'],
-                        'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                        'album': track['album']['name'],
-                        'release_date': track['album']['release_date'],
-                        'duration_ms': track['duration_ms'],
-                        'popularity': track['popularity'],
-                        'spotify_url': track['external_urls']['spotify'],
-                        'preview_url': track['preview_url'],
-                        'image_url': track['album']['images'][0]['url'] if track['album']['images'] else None
-                    }
-                    trending_songs.append(song_info)
-            
-            print(f"✅ Fetched {len(trending_songs)} trending songs from Spotify")
-            return trending_songs
+            chart = []
+            for offset, items in self._iter_playlist_pages(playlist_id, limit, self._playlist_fields(fields)):
+                for idx, item in enumerate(items):
+                    if item['track'] and item['track']['name']:
+                        song = self._format_track(item['track'], rank=offset + idx + 1)
+                        chart.append(song)
+                        yield song
+                        yielded += 1
+            if fields is None:
+                self._trending_cache.set(self._miss_key('trending', country), chart)
+            self._renew_version('trending', country)
+            # Tracks charting together on the same day count as similar
+            self.recommender.observe_tracks(chart, chart=f"{country}:{time.strftime('%Y-%m-%d')}")
+            self._record_chart(country, chart, complete=len(chart) < limit)
             
         except Exception as e:
             print(f"❌ Error fetching trending songs: {e}")
-            return self._get_mock_trending_songs(limit)
+            self._forget_version('trending', country)
+            if not yielded:
+                yield from self._get_mock_trending_songs(limit)
+    
+    def cached_trending_songs(self, limit=10, country='US'):
+        """(data version, songs) from the last trending chart fetched, if recent and long enough.
+        
+        The version changes whenever the chart is refetched, by this call or any
+        other trending request, so output rendered from it can be kept until then.
+        """
+        chart = self._trending_cache.get(self._miss_key('trending', country))
+        if chart is None or len(chart) < limit:
+            chart = self.get_trending_songs(limit=limit, country=country)
+        return self.data_version('trending', country), chart[:limit]
+    
+    def _record_chart(self, country, chart, complete=False):
+        """Append a fetched chart to the history, cut to a fixed depth so snapshots compare"""
+        if len(chart) < self._history_depth and not complete:
+            return
+        try:
+            self.trending_history.record(country, chart[:self._history_depth])
+        except Exception as e:
+            print(f"⚠️ Could not record trending history: {e}")
+    
+    def _get_trending_playlist_id(self, country='US'):
+        """Find the playlist used as the source of trending songs"""
+        # Get featured playlists (trending content)
+        featured_playlists = self.spotify.featured_playlists(country=country, limit=1)
+        
+        if featured_playlists['playlists']['items']:
+            return featured_playlists['playlists']['items'][0]['id']
+        
+        # Fallback to top 50 global playlist
+        results = self.spotify.search(q='Top 50 Global', type='playlist', limit=1)
+        if results['playlists']['items']:
+            return results['playlists']['items'][0]['id']
+        return None
+    
+    def _playlist_fields(self, fields=None):
+        """Spotify ``fields`` filter for playlist items covering the given song fields"""
+        wanted = set(self.REQUIRED_TRACK_FIELDS).union(fields or self.TRACK_FIELDS)
+        spec = merge_fields(*(parse_fields(path) for field, path in self.TRACK_FIELDS.items() if field in wanted))
+        return f"items(track({format_fields(spec)}))"
+    
+    def _iter_playlist_pages(self, playlist_id, limit, fields=None):
+        """Fetch playlist pages concurrently and yield (offset, items) in order.
+        
+        At most SPOTIFY_MAX_CONCURRENCY pages are requested ahead of the one
+        being yielded, so a large limit never queues a burst of Spotify calls.
+        """
+        page_size = self.PLAYLIST_PAGE_SIZE
+        offsets = range(0, limit, page_size)
+        
+        if len(offsets) == 1:
+            tracks = self.spotify.playlist_tracks(playlist_id, fields=fields, limit=limit)
+            yield 0, tracks['items']
+            return
+        
+        next_offsets = iter(offsets)
+        pending = deque()
+        
+        def fetch_next():
+            offset = next(next_offsets, None)
+            if offset is not None:
+                pending.append((offset, self._executor.submit(
+                    self.spotify.playlist_tracks,
+                    playlist_id,
+                    fields=fields,
+                    limit=min(page_size, limit - offset),
+                    offset=offset
+                )))
+        
+        try:
+            for _ in range(max(self._spotify_concurrency, 1)):
+                fetch_next()
+            while pending:
+                offset, future = pending.popleft()
+                items = future.result()['items']
+                # A short page means the playlist has no more tracks
+                last = len(items) < min(page_size, limit - offset)
+                if not last:
+                    fetch_next()
+                yield offset, items
+                if last:
+                    break
+        finally:
+            for _, future in pending:
+                future.cancel()
+    
+    def _format_track(self, track, rank=None):
+        """Convert a Spotify track object into our song format"""
+        for artist in track['artists']:
+            if artist.get('id'):
+                self._remember_artist(artist)
+        # Fields left out of a playlist `fields` filter are missing; they come back as None
+        album = track.get('album') or {}
+        images = album.get('images')
+        song_info = {
+            'title': track['name'],
+            'artist': ', '.join([artist['name'] for artist in track['artists']]),
+            'artists': [artist['name'] for artist in track['artists']],
+            'album': album.get('name'),
+            'release_date': album.get('release_date'),
+            'duration_ms': track.get('duration_ms'),
+            'popularity': track.get('popularity'),
+            'spotify_url': (track.get('external_urls') or {}).get('spotify'),
+            'preview_url': track.get('preview_url'),
+            'image_url': images[0]['url'] if images else None
+        }
+        if rank is not None:
+            song_info = {'rank': rank, **song_info}
+        return song_info
     
     def search_song(self, query, limit=5):
         """Search for songs using Spotify API"""
         try:
             if not self.spotify:
+                return self._offline_search(query, limit)
+            
+            miss_key = self._miss_key('search', query)
+            miss = self._negative_cache.get(miss_key)
+            if miss == 'failed':
+                return self._offline_search(query, limit)
+            if miss == 'not_found':
                 return []
             
             results = self.spotify.search(q=query, type='track', limit=limit)
             songs = []
             
             for track in results['tracks']['items']:
-                song_info = {
-                    'title': track['name'],
-                    'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                    'album': track['album']['name'],
-                    'release_date': track['album']['release_date'],
-                    'duration_ms': track['duration_ms'],
-                    'popularity': track['popularity'],
-                    'spotify_url': track['external_urls']['spotify'],
-                    'preview_url': track['preview_url'],
-                    'image_url': track['album']['images'][0]['url'] if track['album']['images'] else None
-                }
-                songs.append(song_info)
+                songs.append(self._format_track(track))
+            
+            if not songs:
+                self._remember_miss(miss_key)
+            self._renew_version('search', query)
+            self.recommender.observe_tracks(songs)
             
             print(f"✅ Found {len(songs)} songs for query: {query}")
             return songs
             
         except Exception as e:
             print(f"❌ Error searching songs: {e}")
-            return []
+            self._remember_miss(self._miss_key('search', query), failed=True)
+            self._forget_version('search', query)
+            return self._offline_search(query, limit)
+    
+    def _offline_search(self, query, limit=5):
+        """Search the offline catalog when Spotify can't be reached"""
+        from offline_catalog import offline_search
+        return offline_search(query, limit)
     
     def get_artist_info(self, artist_name):
         """Get real artist information from Spotify"""
@@ -251,56 +523,269 @@ class RealMusicService:
             if not self.spotify:
                 return self._get_mock_artist_info(artist_name)
             
-            results = self.spotify.search(q=artist_name, type='artist', limit=1)
+            key = self._miss_key('artist', artist_name)
+            cached = self._artist_cache.get(key)
+            if cached:
+                return cached
             
-            if results['artists']['items']:
-                artist = results['artists']['items'][0]
-                
-                # Get top tracks
-                top_tracks = self.spotify.artist_top_tracks(artist['id'])
-                
-                # Get albums
-                albums = self.spotify.artist_albums(artist['id'], album_type='album', limit=5)
-                
-                artist_info = {
-                    'name': artist['name'],
-                    'followers': artist['followers']['total'],
-                    'popularity': artist['popularity'],
-                    'genres': artist['genres'],
-                    'spotify_url': artist['external_urls']['spotify'],
-                    'images': artist['images'],
-                    'top_tracks': [
-                        {
-                            'name': track['name'],
-                            'album': track['album']['name'],
-                            'popularity': track['popularity'],
-                            'preview_url': track['preview_url']
-                        } for track in top_tracks['tracks'][:5]
-                    ],
-                    'albums': [
-                        {
-                            'name': album['name'],
-                            'release_date': album['release_date'],
-                            'total_tracks': album['total_tracks']
-                        } for album in albums['items']
-                    ]
-                }
+            miss = self._negative_cache.get(key)
+            if miss == 'failed':
+                self._forget_version('artist', artist_name)
+                return self._get_mock_artist_info(artist_name)
+            if miss == 'not_found':
+                return None
+            
+            artist = None
+            artist_id, exact = self.artist_index.match(artist_name)
+            if artist_id and exact:
+                # Known name: fetch the artist and its details together, no search needed
+                artist_future = self._executor.submit(self.spotify.artist, artist_id)
+                top_tracks, albums = self._fetch_artist_details(artist_id)
+                artist = artist_future.result()
+            elif artist_id:
+                # Fuzzy hit: only trusted if the artist's real name is close enough
+                artist = self.spotify.artist(artist_id)
+                if ArtistIndex.close_names(artist_name, artist['name']):
+                    self._remember_artist(artist, artist_name)
+                    top_tracks, albums = self._fetch_artist_details(artist_id)
+                else:
+                    artist = None
+            if artist is None:
+                artist = self._search_artist(artist_name)
+                if artist:
+                    top_tracks, albums = self._fetch_artist_details(artist['id'])
+            
+            if artist:
+                artist_info = self._format_artist(artist, top_tracks, albums)
+                self._artist_cache.set(key, artist_info)
+                self._renew_version('artist', artist_name)
+                self.recommender.observe_artist(artist_info)
                 
                 print(f"✅ Fetched info for artist: {artist_name}")
                 return artist_info
             else:
-                return self._get_mock_artist_info(artist_name)
+                # Spotify has no such artist; don't dress it up with mock data
+                return None
                 
         except Exception as e:
             print(f"❌ Error getting artist info: {e}")
+            self._remember_miss(self._miss_key('artist', artist_name), failed=True)
+            self._forget_version('artist', artist_name)
             return self._get_mock_artist_info(artist_name)
     
+    def prefetch_artists(self, songs):
+        """Warm the artist cache for the artists of listed songs in the background.
+        
+        Called after trending and search replies, whose follow-up questions are
+        usually about one of the listed artists.
+        """
+        if not self._prefetcher or not self.spotify:
+            return
+        
+        def cached(name):
+            key = self._miss_key('artist', name)
+            return key in self._artist_cache or key in self._negative_cache
+        
+        self._prefetcher.submit_artists(songs, cached)
+    
+    def recommend(self, seeds, limit=10):
+        """Recommend tracks similar to seed tracks or artists, without calling Spotify.
+        
+        Returns (recommendations, seeds that matched no known track or artist).
+        """
+        if not self._recommender_seeded:
+            self._recommender_seeded = True
+            catalog_tracks = int(os.getenv('RECOMMEND_CATALOG_TRACKS', '20000'))
+            from offline_catalog import FALLBACK_TRENDING, get_offline_catalog
+            catalog = get_offline_catalog() if catalog_tracks else None
+            if catalog:
+                self.recommender.observe_tracks(catalog.top_tracks(catalog_tracks))
+            else:
+                self.recommender.observe_tracks(FALLBACK_TRENDING)
+        return self.recommender.recommend(seeds, limit)
+    
+    def get_artists_info(self, artist_names=None, artist_ids=None):
+        """Get information for many artists using Spotify's multi-ID endpoints.
+        
+        Names already mapped to a Spotify ID skip the search call, known IDs are
+        fetched 50 at a time through the several-artists endpoint, and the
+        per-artist top tracks and albums are fetched concurrently.
+        """
+        artist_names = list(artist_names or [])
+        artist_ids = list(artist_ids or [])
+        try:
+            if not self.spotify:
+                return [self._get_mock_artist_info(name) for name in artist_names]
+            
+            # Search only for names we have never resolved before
+            searches = {}
+            for name in artist_names:
+                if name in searches or self._lookup_artist_id(name):
+                    continue
+                if self._miss_key('artist', name) in self._negative_cache:
+                    searches[name] = None
+                else:
+                    searches[name] = self._executor.submit(self._search_artist, name)
+            
+            # Artist objects returned by search don't need to be fetched again
+            artists_by_id = {}
+            ordered_ids = []
+            for name in artist_names:
+                if name in searches:
+                    artist = searches[name] and searches[name].result()
+                    if not artist:
+                        continue
+                    artists_by_id[artist['id']] = artist
+                    ordered_ids.append(artist['id'])
+                else:
+                    ordered_ids.append(self._lookup_artist_id(name))
+            ordered_ids = list(dict.fromkeys(ordered_ids + artist_ids))
+            
+            missing_ids = [artist_id for artist_id in ordered_ids if artist_id not in artists_by_id]
+            batches = [
+                self._executor.submit(self.spotify.artists, missing_ids[i:i + self.ARTISTS_BATCH_SIZE])
+                for i in range(0, len(missing_ids), self.ARTISTS_BATCH_SIZE)
+            ]
+            for batch in batches:
+                for artist in batch.result()['artists']:
+                    if artist:
+                        self._remember_artist(artist)
+                        artists_by_id[artist['id']] = artist
+            
+            artists = [artists_by_id[artist_id] for artist_id in ordered_ids if artist_id in artists_by_id]
+            
+            # Fan out top tracks and albums for every artist at once
+            details = [
+                (
+                    self._executor.submit(self.spotify.artist_top_tracks, artist['id']),
+                    self._executor.submit(self.spotify.artist_albums, artist['id'], album_type='album', limit=5)
+                )
+                for artist in artists
+            ]
+            
+            artists_info = [
+                self._format_artist(
+                    artist,
+                    self._future_result(top_tracks, {'tracks': []}),
+                    self._future_result(albums, {'items': []})
+                )
+                for artist, (top_tracks, albums) in zip(artists, details)
+            ]
+            
+            print(f"✅ Fetched info for {len(artists_info)} artists")
+            return artists_info
+            
+        except Exception as e:
+            print(f"❌ Error getting bulk artist info: {e}")
+            return [self._get_mock_artist_info(name) for name in artist_names]
+    
+    def _search_artist(self, artist_name):
+        """Search Spotify for the best matching artist object"""
+        results = self.spotify.search(q=artist_name, type='artist', limit=1)
+        if not results['artists']['items']:
+            self._remember_miss(self._miss_key('artist', artist_name))
+            return None
+        
+        artist = results['artists']['items'][0]
+        self._remember_artist(artist, artist_name)
+        return artist
+    
+    def data_version(self, kind, query):
+        """Version of the data behind a lookup; changes each time it is refetched upstream.
+        
+        0 means the lookup is being answered from mock or fallback data.
+        """
+        return self._data_versions.get(self._miss_key(kind, query), 0)
+    
+    def _renew_version(self, kind, query):
+        self._data_versions.set(self._miss_key(kind, query), next(self._version_counter))
+    
+    def _forget_version(self, kind, query):
+        """Mark a lookup as served from fallback data until it is fetched again"""
+        self._data_versions.pop(self._miss_key(kind, query))
+    
+    @staticmethod
+    def _miss_key(kind, query):
+        """Negative cache key for a lookup, normalized like artist names"""
+        return (kind, ArtistIndex.normalize(query))
+    
+    def _remember_miss(self, key, failed=False):
+        """Record an empty or failed lookup; failures expire sooner than misses"""
+        if failed:
+            self._negative_cache.set(key, 'failed', ttl=self._negative_error_ttl)
+        else:
+            self._negative_cache.set(key, 'not_found')
+    
+    def _fetch_artist_details(self, artist_id):
+        """Fetch an artist's top tracks and albums concurrently"""
+        top_tracks = self._executor.submit(self.spotify.artist_top_tracks, artist_id)
+        albums = self._executor.submit(self.spotify.artist_albums, artist_id, album_type='album', limit=5)
+        return top_tracks.result(), albums.result()
+    
+    def _remember_artist(self, artist, *aliases):
+        """Record the Spotify ID for an artist's name and any query aliases"""
+        for name in (artist['name'],) + aliases:
+            self.artist_index.add(name, artist['id'])
+    
+    def _lookup_artist_id(self, artist_name):
+        """Return the Spotify ID previously resolved for this exact (normalized) name.
+        
+        Fuzzy hits aren't used here: they need the artist's real name to be
+        confirmed, as get_artist_info does, so unknown names are searched.
+        """
+        return self.artist_index.lookup(artist_name, fuzzy=False)
+    
+    @staticmethod
+    def _future_result(future, default):
+        """Return a future's result, or a default if the call failed"""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"⚠️ Spotify request failed: {str(e)[:50]}...")
+            return default
+    
+    def _format_artist(self, artist, top_tracks, albums):
+        """Convert Spotify artist, top tracks and albums into our artist format"""
+        return {
+            'name': artist['name'],
+            'followers': artist['followers']['total'],
+            'popularity': artist['popularity'],
+            'genres': artist['genres'],
+            'spotify_url': artist['external_urls']['spotify'],
+            'images': artist['images'],
+            'top_tracks': [
+                {
+                    'name': track['name'],
+                    'album': track['album']['name'],
+                    'popularity': track['popularity'],
+                    'preview_url': track['preview_url']
+                } for track in top_tracks['tracks'][:5]
+            ],
+            'albums': [
+                {
+                    'name': album['name'],
+                    'release_date': album['release_date'],
+                    'total_tracks': album['total_tracks']
+                } for album in albums['items']
+            ]
+        }
+    
     def generate_ai_lyrics(self, song_title, artist_name, style="pop"):
         """Generate AI lyrics using OpenAI with robust error handling"""
         if not self.openai_client:
             print("⚠️ OpenAI client not available, using fallback lyrics")
             return self._get_mock_lyrics(song_title, artist_name)
         
+        cached = self._similar_completion(f'lyrics:{style}', song_title, artist_name)
+        if cached:
+            return dict(cached)
+        
+        tier = self.openai_usage.tier()
+        if tier == 'exhausted':
+            print("⚠️ OpenAI budget exhausted, using fallback lyrics")
+            self.openai_usage.record_downgrade('lyrics', tier)
+            return self._get_mock_lyrics(song_title, artist_name)
+        
         # Quick network test
         try:
             import socket
@@ -315,10 +800,13 @@ class RealMusicService:
             {"model": "gpt-3.5-turbo", "max_tokens": 600, "timeout": 15},
             {"model": "gpt-3.5-turbo-0125", "max_tokens": 500, "timeout": 20}
         ]
+        if tier == 'cheap':
+            # Near the budget: cheapest model only, shorter lyrics
+            models_and_configs = [{"model": "gpt-4o-mini", "max_tokens": 400, "timeout": 10}]
         
         for attempt, config in enumerate(models_and_configs, 1):
             try:
-                print(f"🎤 Generating lyrics (attempt {attempt}/3 with {config['model']})...")
+                print(f"🎤 Generating lyrics (attempt {attempt}/{len(models_and_configs)} with {config['model']})...")
                 
                 # Simplified prompt for better connectivity
                 if attempt == 1:
@@ -337,6 +825,7 @@ class RealMusicService:
                     temperature=0.7,
                     timeout=config["timeout"]
                 )
+                self.openai_usage.record('lyrics', config["model"], getattr(response, 'usage', None))
                 
                 if response and response.choices and response.choices[0].message.content:
                     ai_lyrics = response.choices[0].message.content.strip()
@@ -352,6 +841,9 @@ class RealMusicService:
                         }
                         
                         print(f"✅ Generated AI lyrics for: {song_title} by {artist_name}")
+                        if tier == 'cheap':
+                            self.openai_usage.record_downgrade('lyrics', tier)
+                        self._store_completion(f'lyrics:{style}', lyrics_data, song_title, artist_name)
                         return lyrics_data
                     else:
                         print(f"⚠️ Response too short from {config['model']}, trying next...")
@@ -390,6 +882,16 @@ class RealMusicService:
             if not self.openai_client:
                 return f"Analysis not available for '{song_title}' by {artist_name}"
             
+            cached = self._similar_completion('analysis', song_title, artist_name)
+            if cached:
+                return cached
+            
+            tier = self.openai_usage.tier()
+            if tier == 'exhausted':
+                print("⚠️ OpenAI budget exhausted, skipping analysis")
+                self.openai_usage.record_downgrade('analysis', tier)
+                return f"Analysis not available for '{song_title}' by {artist_name}"
+            
             prompt = f"""Provide a detailed musical analysis of the song "{song_title}" by {artist_name}.
 
 Include:
@@ -410,88 +912,122 @@ Provide an engaging, informative analysis:"""
                     {"role": "system", "content": "You are a music expert and critic who provides insightful analysis of songs and artists."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
+                max_tokens=300 if tier == 'cheap' else 500,
                 temperature=0.7
             )
+            self.openai_usage.record('analysis', "gpt-4o-mini", getattr(response, 'usage', None))
             
             analysis = response.choices[0].message.content
             print(f"✅ Generated analysis for: {song_title}")
+            if tier == 'cheap':
+                self.openai_usage.record_downgrade('analysis', tier)
+            self._store_completion('analysis', analysis, song_title, artist_name)
             return analysis
             
         except Exception as e:
             print(f"❌ Error generating analysis: {e}")
             return f"Could not generate analysis for '{song_title}' by {artist_name}"
     
-    def _get_mock_trending_songs(self, limit=10):
-        """High-quality curated trending songs when Spotify API is unavailable"""
-        # Current trending songs (updated for 2025)
-        curated_trending = [
-            {
-                'rank': 1, 'title': 'Flowers', 'artist': 'Miley Cyrus',
-                'album': 'Endless Summer Vacation', 'popularity': 95,
-                'release_date': '2023-01-13', 'duration_ms': 200000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 2, 'title': 'Anti-Hero', 'artist': 'Taylor Swift',
-                'album': 'Midnights', 'popularity': 94,
-                'release_date': '2022-10-21', 'duration_ms': 201000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 3, 'title': 'As It Was', 'artist': 'Harry Styles',
-                'album': 'Harry\'s House', 'popularity': 93,
-                'release_date': '2022-04-01', 'duration_ms': 167000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 4, 'title': 'Heat Waves', 'artist': 'Glass Animals',
-                'album': 'Dreamland', 'popularity': 92,
-                'release_date': '2020-08-07', 'duration_ms': 238000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 5, 'title': 'Blinding Lights', 'artist': 'The Weeknd',
-                'album': 'After Hours', 'popularity': 91,
-                'release_date': '2019-11-29', 'duration_ms': 200000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 6, 'title': 'Good 4 U', 'artist': 'Olivia Rodrigo',
-                'album': 'SOUR', 'popularity': 90,
-                'release_date': '2021-05-14', 'duration_ms': 178000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 7, 'title': 'Stay', 'artist': 'The Kid LAROI, Justin Bieber',
-                'album': 'F*CK LOVE 3: OVER YOU', 'popularity': 89,
-                'release_date': '2021-07-09', 'duration_ms': 141000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 8, 'title': 'Bad Habit', 'artist': 'Steve Lacy',
-                'album': 'Gemini Rights', 'popularity': 88,
-                'release_date': '2022-06-29', 'duration_ms': 216000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 9, 'title': 'Unholy', 'artist': 'Sam Smith (feat. Kim Petras)',
-                'album': 'Unholy', 'popularity': 87,
-                'release_date': '2022-09-22', 'duration_ms': 156000,
-                'spotify_url': 'https://open.spotify.com/track/example'
-            },
-            {
-                'rank': 10, 'title': 'About Damn Time', 'artist': 'Lizzo',
-                'album': 'Special', 'popularity': 86,
-                'release_date': '2022-04-14', 'duration_ms': 192000,
-                'spotify_url': 'https://open.spotify.com/track/example'
+    def get_song_insights(self, song_title, artist_name, style="pop"):
+        """Get AI lyrics and analysis for a song from a single JSON-structured completion.
+        
+        Returns {'lyrics': <generate_ai_lyrics result>, 'analysis': <analysis text>}.
+        Both halves are stored in the completion caches; if only one is cached,
+        just the other is generated, and if the combined call fails the
+        separate calls are used.
+        """
+        if not self.openai_client:
+            return {
+                'lyrics': self.generate_ai_lyrics(song_title, artist_name, style),
+                'analysis': self.get_song_analysis(song_title, artist_name)
+            }
+        
+        cached_lyrics = self._similar_completion(f'lyrics:{style}', song_title, artist_name)
+        cached_analysis = self._similar_completion('analysis', song_title, artist_name)
+        if cached_lyrics or cached_analysis:
+            return {
+                'lyrics': dict(cached_lyrics) if cached_lyrics else self.generate_ai_lyrics(song_title, artist_name, style),
+                'analysis': cached_analysis or self.get_song_analysis(song_title, artist_name)
+            }
+        
+        # Near or over budget, the separate calls apply (and count) their own downgrades and fallbacks
+        if self.openai_usage.tier() != 'normal':
+            return {
+                'lyrics': self.generate_ai_lyrics(song_title, artist_name, style),
+                'analysis': self.get_song_analysis(song_title, artist_name)
             }
-        ]
         
-        return curated_trending[:limit]
+        model = "gpt-4o-mini"
+        prompt = f"""For the song "{song_title}" by {artist_name}, return a JSON object with two string fields:
+
+"lyrics": original {style} song lyrics inspired by the title and artist. Include verse, chorus, verse, chorus, bridge, chorus.
+"analysis": an engaging musical analysis covering style and genre, themes, emotional tone, cultural impact, and why it might be trending or popular."""
+        
+        try:
+            print(f"🎼 Generating lyrics and analysis together for: {song_title}")
+            response = self.openai_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You are a songwriter and music critic. Reply with JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=1300,
+                temperature=0.7,
+                timeout=20
+            )
+            self.openai_usage.record('insights', model, getattr(response, 'usage', None))
+            insights = json.loads(response.choices[0].message.content)
+            ai_lyrics = str(insights.get('lyrics') or '').strip()
+            analysis = str(insights.get('analysis') or '').strip()
+            if len(ai_lyrics) <= 50 or not analysis:
+                raise ValueError("incomplete insights response")
+        except Exception as e:
+            print(f"❌ Combined insights call failed ({str(e)[:50]}), generating separately")
+            return {
+                'lyrics': self.generate_ai_lyrics(song_title, artist_name, style),
+                'analysis': self.get_song_analysis(song_title, artist_name)
+            }
+        
+        lyrics_data = {
+            'title': song_title,
+            'artist': artist_name,
+            'lyrics': ai_lyrics,
+            'generated_by': f'AI (OpenAI {model})',
+            'style': style,
+            'note': 'These are AI-generated original lyrics inspired by the song title and artist style.'
+        }
+        self._store_completion(f'lyrics:{style}', lyrics_data, song_title, artist_name)
+        self._store_completion('analysis', analysis, song_title, artist_name)
+        print(f"✅ Generated insights for: {song_title} by {artist_name}")
+        return {'lyrics': lyrics_data, 'analysis': analysis}
+    
+    def _similar_completion(self, scope, song_title, artist_name):
+        """Return a cached completion for a near-identical song and artist"""
+        if self.similarity_cache is None:
+            return None
+        cached = self.similarity_cache.get(scope, song_title, artist_name)
+        if cached:
+            print(f"♻️ Reusing cached {scope} completion for: {song_title}")
+        return cached
+    
+    def _store_completion(self, scope, completion, song_title, artist_name):
+        """Remember a successful completion for similar future prompts"""
+        if self.similarity_cache is not None:
+            self.similarity_cache.set(scope, completion, song_title, artist_name)
+    
+    def _get_mock_trending_songs(self, limit=10):
+        """Fallback trending songs from the offline catalog, or a curated list without one"""
+        # Imported on first fallback only: the catalog needs numpy
+        from offline_catalog import offline_trending
+        return offline_trending(limit)
     
     def _get_mock_artist_info(self, artist_name):
-        """Mock artist info when API is not available"""
+        """Artist info from the offline catalog, or mock info when API is not available"""
+        from offline_catalog import offline_artist_info
+        artist_info = offline_artist_info(artist_name)
+        if artist_info:
+            return artist_info
         return {
             'name': artist_name,
             'followers': 1000000,
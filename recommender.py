@@ -0,0 +1,246 @@
+import threading
+import time
+import zlib
+
+from artist_index import ArtistIndex
+
+
+class TrackRecommender:
+    """Content-based track recommendations from data the service already holds.
+
+    Tracks seen in trending charts and search results (plus, optionally, the
+    most popular offline catalog tracks) are embedded as feature vectors:
+    standardized popularity, duration and release year, hashed artist and
+    genre one-hots, and hashed chart memberships so tracks that trend together
+    end up close. Recommendations are cosine-similarity top-k over a NumPy
+    matrix, rebuilt lazily when new data arrives; past ``ann_threshold`` tracks
+    candidates come from random-hyperplane LSH buckets and are re-ranked
+    exactly.
+    """
+
+    GENRE_DIM = 32
+    ARTIST_DIM = 32
+    CHART_DIM = 64
+    # Relative weight of each feature block in the cosine similarity
+    WEIGHTS = {'numeric': 1.0, 'artist': 0.8, 'genre': 1.2, 'chart': 1.0}
+
+    def __init__(self, max_tracks=200000, rebuild_interval=30, ann_threshold=100000,
+                 ann_tables=8, ann_bits=10):
+        self.max_tracks = max_tracks
+        self.rebuild_interval = rebuild_interval
+        self.ann_threshold = ann_threshold
+        self.ann_tables = ann_tables
+        self.ann_bits = ann_bits
+        self._tracks = {}
+        self._charts = {}
+        self._genres = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index = None
+        self._built_at = 0
+
+    @staticmethod
+    def _track_key(song):
+        return ArtistIndex.normalize(song['title']), ArtistIndex.normalize(song['artist'])
+
+    def observe_tracks(self, songs, chart=None):
+        """Record songs (our song format); songs from one chart snapshot share ``chart``"""
+        with self._lock:
+            for song in songs:
+                if not song.get('title') or not song.get('artist'):
+                    continue
+                key = self._track_key(song)
+                if key not in self._tracks:
+                    if len(self._tracks) >= self.max_tracks:
+                        continue
+                    self._dirty = True
+                # Songs fetched with a fields filter may lack some values; keep the known ones
+                self._tracks[key] = {
+                    **self._tracks.get(key, {}),
+                    **{k: v for k, v in song.items() if k != 'rank' and v is not None}
+                }
+                if chart and chart not in self._charts.setdefault(key, set()):
+                    self._charts[key].add(chart)
+                    self._dirty = True
+
+    def observe_artist(self, artist_info):
+        """Record an artist's genres from artist info"""
+        if artist_info and artist_info.get('genres'):
+            key = ArtistIndex.normalize(artist_info['name'])
+            with self._lock:
+                if self._genres.get(key) != artist_info['genres']:
+                    self._genres[key] = list(artist_info['genres'])
+                    self._dirty = True
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def recommend(self, seeds, limit=10):
+        """Top tracks similar to all seeds (track titles or artist names).
+
+        Returns (recommendations, unknown seeds). Each seed resolves to the
+        tracks with that title, or else to every track by that artist; all
+        seeds are scored in one batched matrix product and their similarities
+        averaged.
+        """
+        import numpy as np
+
+        index = self._current_index()
+        if index is None:
+            return [], list(seeds)
+
+        queries, exclude, unknown = [], set(), []
+        for seed in seeds:
+            rows, is_artist = self._resolve_seed(index, seed)
+            if rows is None:
+                unknown.append(seed)
+                continue
+            vector = index['matrix'][rows].mean(axis=0)
+            norm = np.linalg.norm(vector)
+            if norm:
+                queries.append(vector / norm)
+            # Don't recommend the seeds back (or, for an artist seed, the artist's own tracks)
+            exclude.update(int(row) for row in rows)
+            if is_artist:
+                exclude.update(int(row) for row in np.flatnonzero(index['artists'] == index['artists'][rows[0]]))
+        if not queries:
+            return [], unknown
+
+        queries = np.stack(queries).astype(np.float32)
+        candidates = self._candidates(index, queries, limit + len(exclude))
+        scores = (index['matrix'][candidates] @ queries.T).mean(axis=1)
+        if exclude:
+            scores[np.isin(candidates, list(exclude))] = -np.inf
+
+        top = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [
+            {**index['songs'][int(candidates[i])], 'score': round(float(scores[i]), 4)}
+            for i in top if np.isfinite(scores[i])
+        ], unknown
+
+    def _resolve_seed(self, index, seed):
+        """(rows, is_artist) for a seed: "title", "title by artist" or "artist"""
+        import numpy as np
+
+        key = ArtistIndex.normalize(seed)
+        rows = index['by_title'].get(key)
+        if not rows and ' by ' in key:
+            title, _, artist = key.rpartition(' by ')
+            rows = [row for row in index['by_title'].get(title, ()) if index['keys'][row][1] == artist]
+        if rows:
+            return np.array(rows), False
+        rows = index['by_artist'].get(key)
+        return (np.array(rows), True) if rows else (None, True)
+
+    def _candidates(self, index, queries, needed):
+        """Row indices to score: every row, or the LSH buckets of the queries"""
+        import numpy as np
+
+        count = len(index['songs'])
+        if not index.get('planes'):
+            return np.arange(count)
+        candidates = set()
+        for planes, buckets in zip(index['planes'], index['buckets']):
+            for code in self._codes(queries, planes):
+                candidates.update(buckets.get(int(code), ()))
+        # Too few neighbours in the buckets; fall back to brute force
+        if len(candidates) < needed * 4:
+            return np.arange(count)
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    def _codes(self, vectors, planes):
+        import numpy as np
+
+        bits = (vectors @ planes) > 0
+        return bits.astype(np.int64) @ (1 << np.arange(self.ann_bits, dtype=np.int64))
+
+    def _current_index(self):
+        with self._lock:
+            stale = self._dirty and time.monotonic() - self._built_at >= self.rebuild_interval
+            if not self._tracks or not (stale or self._index is None):
+                return self._index
+            keys = list(self._tracks)
+            songs = [self._tracks[key] for key in keys]
+            charts = [self._charts.get(key, ()) for key in keys]
+            genres = dict(self._genres)
+            self._dirty = False
+            self._built_at = time.monotonic()
+
+        index = self._build_index(keys, songs, charts, genres)
+        with self._lock:
+            self._index = index
+        return index
+
+    def _build_index(self, keys, songs, charts, genres):
+        """Feature matrix (unit rows) plus lookup tables for a snapshot of tracks"""
+        import numpy as np
+
+        count = len(songs)
+        numeric = np.array([
+            [
+                song.get('popularity') or 0,
+                (song.get('duration_ms') or 0) / 60000,
+                int(str(song.get('release_date') or '0')[:4] or 0)
+            ]
+            for song in songs
+        ], dtype=np.float32)
+        known_year = numeric[:, 2] > 0
+        if known_year.any():
+            numeric[~known_year, 2] = numeric[known_year, 2].mean()
+        std = numeric.std(axis=0)
+        numeric = (numeric - numeric.mean(axis=0)) / np.where(std > 0, std, 1)
+
+        artist_block = np.zeros((count, self.ARTIST_DIM), dtype=np.float32)
+        genre_block = np.zeros((count, self.GENRE_DIM), dtype=np.float32)
+        chart_block = np.zeros((count, self.CHART_DIM), dtype=np.float32)
+        for row, ((_, artist), track_charts) in enumerate(zip(keys, charts)):
+            artist_block[row, self._bucket(artist, self.ARTIST_DIM)] = 1
+            for genre in genres.get(artist, ()):
+                genre_block[row, self._bucket(genre, self.GENRE_DIM)] += 1
+            for chart in track_charts:
+                chart_block[row, self._bucket(chart, self.CHART_DIM)] += 1
+
+        blocks = []
+        for name, block in (('numeric', numeric), ('artist', artist_block),
+                            ('genre', genre_block), ('chart', chart_block)):
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            blocks.append(block / np.where(norms > 0, norms, 1) * self.WEIGHTS[name])
+        matrix = np.hstack(blocks).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1)
+
+        by_title, by_artist, artist_ids = {}, {}, {}
+        for row, (title, artist) in enumerate(keys):
+            by_title.setdefault(title, []).append(row)
+            by_artist.setdefault(artist, []).append(row)
+            artist_ids.setdefault(artist, len(artist_ids))
+
+        index = {
+            'matrix': matrix,
+            'songs': songs,
+            'keys': keys,
+            'by_title': by_title,
+            'by_artist': by_artist,
+            'artists': np.array([artist_ids[artist] for _, artist in keys]),
+            'planes': None
+        }
+        if count >= self.ann_threshold:
+            rng = np.random.default_rng(0)
+            index['planes'] = [
+                rng.standard_normal((matrix.shape[1], self.ann_bits)).astype(np.float32)
+                for _ in range(self.ann_tables)
+            ]
+            index['buckets'] = []
+            for planes in index['planes']:
+                codes = self._codes(matrix, planes)
+                order = np.argsort(codes, kind='stable')
+                unique, starts = np.unique(codes[order], return_index=True)
+                index['buckets'].append({
+                    int(code): rows for code, rows in zip(unique, np.split(order, starts[1:]))
+                })
+        return index
+
+    @staticmethod
+    def _bucket(value, dim):
+        return zlib.crc32(value.encode('utf-8')) % dim
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) when no tokenizer is loaded"""
+    return max(1, len(text) // 4)
+
+
+class SessionMemory:
+    """Ring buffer of conversation turns capped by turn count and token budget"""
+
+    def __init__(self, max_turns: int = 10, max_tokens: int = 1000,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.turns = deque(maxlen=max_turns)
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+    def add_turn(self, user_message: str, ai_message: str) -> int:
+        """Append a turn and drop the oldest ones; returns the change in tokens"""
+        before = self.tokens
+        if len(self.turns) == self.turns.maxlen:
+            self.tokens -= self.turns[0][2]
+
+        # Counted as rendered, plus the newline joining it to the next turn
+        cost = self.count_tokens(self._render_turn(user_message, ai_message)) + 1
+        self.turns.append((user_message, ai_message, cost))
+        self.tokens += cost
+
+        # A single turn over the budget is dropped too
+        while self.tokens > self.max_tokens and self.turns:
+            self.tokens -= self.turns.popleft()[2]
+
+        self.last_used = time.monotonic()
+        return self.tokens - before
+
+    def history(self) -> List[Tuple[str, str]]:
+        """(user, ai) pairs currently in the window, oldest first"""
+        return [(user, ai) for user, ai, _ in self.turns]
+
+    def render(self, max_tokens: Optional[int] = None) -> str:
+        """Format the window as prompt history, keeping only the newest turns that fit max_tokens"""
+        turns = []
+        for user, ai, cost in reversed(self.turns):
+            if max_tokens is not None:
+                if cost > max_tokens:
+                    break
+                max_tokens -= cost
+            turns.append(self._render_turn(user, ai))
+        return "\n".join(reversed(turns))
+
+    @staticmethod
+    def _render_turn(user_message: str, ai_message: str) -> str:
+        return f"User: {user_message}\nAssistant: {ai_message}"
+
+
+class SessionStore:
+    """Per-session conversation memories with LRU/TTL eviction and a global token ceiling"""
+
+    def __init__(self, max_turns: int = 10, max_tokens: int = 1000, idle_ttl: float = 1800,
+                 max_sessions: int = 1000, max_total_tokens: int = 200000,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.count_tokens = count_tokens
+        self.total_tokens = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[SessionMemory]:
+        """Return a session's memory without creating it"""
+        with self._lock:
+            self._evict_idle()
+            return self._sessions.get(session_id)
+
+    def add_turn(self, session_id: str, user_message: str, ai_message: str) -> None:
+        """Record a turn for a session, creating it and evicting others as needed"""
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = SessionMemory(self.max_turns, self.max_tokens, self.count_tokens)
+                self._sessions[session_id] = memory
+            self._sessions.move_to_end(session_id)
+            self.total_tokens += memory.add_turn(user_message, ai_message)
+            self._evict_idle()
+            self._evict_over_limit(keep=session_id)
+
+    def render(self, session_id: str, max_tokens: Optional[int] = None) -> str:
+        """Prompt history for a session within max_tokens, or an empty string"""
+        # Rendered under the lock: a concurrent add_turn would mutate the deque mid-iteration
+        with self._lock:
+            self._evict_idle()
+            memory = self._sessions.get(session_id)
+            return memory.render(max_tokens) if memory else ""
+
+    def clear(self, session_id: str) -> None:
+        """Forget a session"""
+        with self._lock:
+            self._drop(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _drop(self, session_id: str) -> None:
+        memory = self._sessions.pop(session_id, None)
+        if memory:
+            self.total_tokens -= memory.tokens
+
+    def _evict_idle(self) -> None:
+        """Drop sessions idle longer than the TTL (oldest are at the front)"""
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, memory = next(iter(self._sessions.items()))
+            if memory.last_used > cutoff:
+                break
+            self._drop(session_id)
+
+    def _evict_over_limit(self, keep: str) -> None:
+        """Drop least recently used sessions until under the global ceilings"""
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.total_tokens > self.max_total_tokens
+        ):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id)
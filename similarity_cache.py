@@ -0,0 +1,115 @@
+import re
+import threading
+import unicodedata
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the cache simply stays disabled
+    np = None
+
+
+class SimilarityCache:
+    """Near-duplicate cache for AI completions using hashed character n-grams.
+
+    Each prompt input (e.g. song title, artist) is normalized and embedded as
+    its own hashed n-gram block; blocks are scaled by ``part_weights`` so the
+    cosine similarity is a weighted sum of per-input similarities. Vectors live
+    in a preallocated NumPy matrix and a lookup is one matrix-vector product
+    over all live rows, so it stays fast well past 100k entries. When full,
+    the oldest entries are overwritten.
+    """
+
+    def __init__(self, threshold=0.9, maxsize=100000, dim=512, part_weights=(0.75, 0.25),
+                 ngram_sizes=(2, 3, 4)):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.part_weights = part_weights
+        self.part_dim = dim // len(part_weights)
+        self.dim = self.part_dim * len(part_weights)
+        self.ngram_sizes = ngram_sizes
+        self.enabled = np is not None
+        self._values = [None] * maxsize
+        self._count = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._scopes = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def normalize(text):
+        """Drop bracketed qualifiers like "(live)", accents, case and punctuation"""
+        text = re.sub(r'[\(\[][^\)\]]*[\)\]]', ' ', text)
+        text = re.sub(r'\s+-\s+.*(live|remaster|version|edit|mix).*$', ' ', text, flags=re.IGNORECASE)
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+        text = re.sub(r'[^\w]+', ' ', text)
+        return ' '.join(text.split())
+
+    def _embed_part(self, text):
+        """Unit-length hashed n-gram counts for a single input"""
+        padded = f" {self.normalize(text)} "
+        indices = [
+            zlib.crc32(padded[i:i + n].encode('utf-8')) % self.part_dim
+            for n in self.ngram_sizes
+            for i in range(len(padded) - n + 1)
+        ]
+        vector = np.bincount(indices, minlength=self.part_dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, *parts):
+        """Embed prompt inputs as one unit-length weighted vector"""
+        if len(parts) != len(self.part_weights):
+            raise ValueError(f"Expected {len(self.part_weights)} inputs, got {len(parts)}")
+        return np.concatenate([
+            np.sqrt(weight, dtype=np.float32) * self._embed_part(part)
+            for part, weight in zip(parts, self.part_weights)
+        ])
+
+    @staticmethod
+    def _scope_id(scope):
+        return zlib.crc32(scope.encode('utf-8'))
+
+    def get(self, scope, *parts):
+        """Return the cached value most similar to the inputs, if close enough"""
+        if not self.enabled or not self._count:
+            return None
+
+        vector = self.embed(*parts)
+        scope_id = self._scope_id(scope)
+        with self._lock:
+            live = min(self._count, self.maxsize)
+            scores = self._vectors[:live] @ vector
+            scores[self._scopes[:live] != scope_id] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._values[best]
+
+    def set(self, scope, value, *parts):
+        """Store a completion for the inputs within a scope (e.g. route and style)"""
+        if not self.enabled:
+            return
+
+        vector = self.embed(*parts)
+        with self._lock:
+            slot = self._count % self.maxsize
+            if slot >= len(self._vectors):
+                self._grow()
+            self._vectors[slot] = vector
+            self._scopes[slot] = self._scope_id(scope)
+            self._values[slot] = value
+            self._count += 1
+
+    def _grow(self):
+        """Double the matrix capacity, up to maxsize rows"""
+        capacity = min(self.maxsize, max(1024, 2 * len(self._vectors)))
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        scopes = np.full(capacity, -1, dtype=np.int64)
+        vectors[:len(self._vectors)] = self._vectors
+        scopes[:len(self._scopes)] = self._scopes
+        self._vectors, self._scopes = vectors, scopes
+
+    def __len__(self):
+        return min(self._count, self.maxsize)
@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows; one process per store there
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it chart history isn't recorded
+    np = None
+
+from artist_index import ArtistIndex
+
+DAY = 86400
+
+
+class TrendingHistory:
+    """Columnar store of trending chart snapshots with rank-change analytics.
+
+    Snapshots are stored per country and UTC day as NumPy segments
+    (``<dir>/<country>/<YYYY-MM-DD>.npz``) holding three columns (snapshot
+    time, rank, track number), with track numbers resolved through a shared
+    append-only ``tracks.jsonl`` dictionary (line N is track N). Writers from
+    several processes serialize on a file lock and catch up on the dictionary
+    before numbering new tracks. Past days are immutable and cached once read.
+    Queries pivot the last snapshot of each day into a day x track rank
+    matrix, so movers, new entries and streaks are a few array operations
+    even over months of snapshots.
+    """
+
+    def __init__(self, path=None, min_interval=None):
+        self.path = path or os.getenv('TRENDING_HISTORY_PATH', 'data/trending_history')
+        # Unchanged charts are recorded at most this often (seconds)
+        self.min_interval = min_interval if min_interval is not None else float(
+            os.getenv('TRENDING_HISTORY_MIN_INTERVAL', '3600'))
+        self.enabled = np is not None
+        self._lock = threading.Lock()
+        self._tracks = []
+        self._track_numbers = {}
+        self._tracks_offset = 0
+        self._last_snapshot = {}
+        self._segments = {}
+        self._load_tracks()
+
+    # Recording
+
+    def record(self, country, songs, taken_at=None):
+        """Append a chart snapshot; returns False if it was skipped as a duplicate"""
+        if not self.enabled or not songs:
+            return False
+        taken_at = int(taken_at if taken_at is not None else time.time())
+        country = self._country(country)
+
+        with self._store_lock():
+            self._sync_tracks()
+            numbers = [self._track_number(song) for song in songs]
+            self._save_tracks()
+            # Another process may have recorded since; today's segment is the shared truth
+            previous = self._latest_snapshot(country) or self._last_snapshot.get(country)
+            if previous and previous[1] == numbers and taken_at - previous[0] < self.min_interval:
+                return False
+            self._last_snapshot[country] = (taken_at, numbers)
+
+            path = self._segment_path(country, taken_at // DAY)
+            existing = self._read_segment(path)
+            segment = {
+                'taken_at': np.concatenate([existing['taken_at'], np.full(len(numbers), taken_at, dtype=np.int64)]),
+                'rank': np.concatenate([existing['rank'], np.array(
+                    [song.get('rank') or i for i, song in enumerate(songs, 1)], dtype=np.uint16)]),
+                'track': np.concatenate([existing['track'], np.array(numbers, dtype=np.uint32)])
+            }
+            self._write_segment(path, segment)
+        return True
+
+    @contextmanager
+    def _store_lock(self):
+        """Exclusive access to the store across threads and processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _track_number(self, song):
+        key = (ArtistIndex.normalize(song['title']), ArtistIndex.normalize(song['artist']))
+        number = self._track_numbers.get(key)
+        if number is None:
+            number = len(self._tracks)
+            self._tracks.append([song['title'], song['artist'], song.get('spotify_url')])
+            self._track_numbers[key] = number
+            self._new_tracks.append(self._tracks[-1])
+        return number
+
+    def _latest_snapshot(self, country):
+        today = int(time.time()) // DAY
+        segment = self._read_segment(self._segment_path(country, today))
+        if not len(segment['taken_at']):
+            return None
+        latest = segment['taken_at'][-1]
+        return int(latest), segment['track'][segment['taken_at'] == latest].tolist()
+
+    # Queries
+
+    def history(self, country='US', days=30, limit=10, query=None):
+        """The last chart of each day, optionally only tracks matching ``query``"""
+        chart = self._daily_chart(country, days)
+        if chart is None:
+            return []
+        day_numbers, tracks, ranks = chart
+
+        columns = np.arange(len(tracks))
+        if query:
+            needle = ArtistIndex.normalize(query)
+            columns = np.array([
+                i for i, track in enumerate(tracks)
+                if needle in ArtistIndex.normalize(f"{self._tracks[track][0]} {self._tracks[track][1]}")
+            ], dtype=np.int64)
+
+        result = []
+        for day, row in zip(day_numbers, ranks):
+            present = columns[row[columns] > 0]
+            present = present[np.argsort(row[present], kind='stable')][:limit]
+            result.append({
+                'date': self._date(day),
+                'songs': [self._song(tracks[col], rank=int(row[col])) for col in present]
+            })
+        return result
+
+    def movers(self, country='US', days=1, limit=10, streak_days=90):
+        """Rank changes between the latest daily chart and the one ``days`` earlier,
+        with new entries, drop-outs and charting streaks (up to ``streak_days``)"""
+        chart = self._daily_chart(country, max(days + 1, streak_days))
+        if chart is None:
+            return None
+        day_numbers, tracks, ranks = chart
+
+        latest = ranks[-1]
+        # Compare against the newest chart at least `days` old, or the oldest we have
+        earlier = np.flatnonzero(day_numbers <= day_numbers[-1] - days)
+        base_index = earlier[-1] if len(earlier) else 0
+        previous = ranks[base_index]
+
+        both = (latest > 0) & (previous > 0)
+        change = np.where(both, previous.astype(np.int32) - latest.astype(np.int32), 0)
+        climbers = np.flatnonzero(change > 0)
+        fallers = np.flatnonzero(change < 0)
+        new_entries = np.flatnonzero((latest > 0) & (previous == 0))
+        dropped = np.flatnonzero((latest == 0) & (previous > 0))
+
+        # Streak: consecutive daily charts, ending with the latest, that a track appears in
+        present = ranks[::-1] > 0
+        streaks = np.where(present.all(axis=0), len(present), np.argmin(present, axis=0))
+        charting = np.flatnonzero(latest > 0)
+
+        def entries(columns, order):
+            return [
+                {
+                    **self._song(tracks[col], rank=int(latest[col]) or None),
+                    'previous_rank': int(previous[col]) or None,
+                    'change': int(change[col]),
+                    'streak_days': int(streaks[col])
+                }
+                for col in columns[np.argsort(order, kind='stable')][:limit]
+            ]
+
+        return {
+            'country': self._country(country),
+            'from': self._date(day_numbers[base_index]),
+            'to': self._date(day_numbers[-1]),
+            'climbers': entries(climbers, -change[climbers]),
+            'fallers': entries(fallers, change[fallers]),
+            'new_entries': entries(new_entries, latest[new_entries]),
+            'dropped_out': entries(dropped, previous[dropped]),
+            'longest_streaks': entries(charting, -streaks[charting] * 1000 + latest[charting])
+        }
+
+    def _daily_chart(self, country, days):
+        """(day numbers, track numbers, day x track rank matrix, 0 = not charting)"""
+        if not self.enabled:
+            return None
+        country = self._country(country)
+        # Segments may reference tracks numbered by other processes
+        with self._lock:
+            self._sync_tracks()
+        today = int(time.time()) // DAY
+        segments = [
+            self._read_segment(self._segment_path(country, day))
+            for day in range(today - max(days, 1) + 1, today + 1)
+        ]
+        taken_at = np.concatenate([segment['taken_at'] for segment in segments])
+        if not len(taken_at):
+            return None
+        rank = np.concatenate([segment['rank'] for segment in segments])
+        track = np.concatenate([segment['track'] for segment in segments])
+
+        # Keep only the last snapshot of each day
+        day = taken_at // DAY
+        day_numbers, last_index = np.unique(day[::-1], return_index=True)
+        last_taken = taken_at[::-1][last_index]
+        keep = taken_at == last_taken[np.searchsorted(day_numbers, day)]
+
+        tracks, columns = np.unique(track[keep], return_inverse=True)
+        ranks = np.zeros((len(day_numbers), len(tracks)), dtype=np.uint16)
+        ranks[np.searchsorted(day_numbers, day[keep]), columns] = rank[keep]
+        return day_numbers, tracks, ranks
+
+    def _song(self, track, rank=None):
+        title, artist, url = self._tracks[int(track)]
+        return {'rank': rank, 'title': title, 'artist': artist, 'spotify_url': url}
+
+    # Storage
+
+    @staticmethod
+    def _country(country):
+        return re.sub(r'[^A-Z0-9]', '', (country or 'US').upper()) or 'US'
+
+    @staticmethod
+    def _date(day):
+        return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=int(day))).strftime('%Y-%m-%d')
+
+    def _segment_path(self, country, day):
+        return os.path.join(self.path, country, f"{self._date(day)}.npz")
+
+    def _read_segment(self, path):
+        """A day's columns; past days are cached, today's is re-read when it changes"""
+        try:
+            stat = os.stat(path)
+            mtime = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return {
+                'taken_at': np.zeros(0, dtype=np.int64),
+                'rank': np.zeros(0, dtype=np.uint16),
+                'track': np.zeros(0, dtype=np.uint32)
+            }
+        cached = self._segments.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with np.load(path) as data:
+            segment = {name: data[name] for name in ('taken_at', 'rank', 'track')}
+        self._segments[path] = (mtime, segment)
+        return segment
+
+    def _write_segment(self, path, segment):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **segment)
+        os.replace(tmp_path, path)
+        self._segments.pop(path, None)
+
+    def _load_tracks(self):
+        self._new_tracks = []
+        if not self.enabled:
+            return
+        try:
+            with self._store_lock():
+                self._sync_tracks()
+        except Exception as e:
+            print(f"⚠️ Could not load trending history tracks: {e}")
+
+    def _sync_tracks(self):
+        """Read tracks appended to the dictionary since we last looked (by any process)"""
+        try:
+            with open(os.path.join(self.path, 'tracks.jsonl'), 'rb') as f:
+                f.seek(self._tracks_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only whole lines; a line still being appended is picked up next time
+        data = data[:data.rfind(b'\n') + 1]
+        for line in data.splitlines():
+            title, artist, url = json.loads(line)
+            key = (ArtistIndex.normalize(title), ArtistIndex.normalize(artist))
+            self._track_numbers.setdefault(key, len(self._tracks))
+            self._tracks.append([title, artist, url])
+        self._tracks_offset += len(data)
+
+    def _save_tracks(self):
+        """Append newly numbered tracks; call with the store lock held, after _sync_tracks"""
+        if not self._new_tracks:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        data = ''.join(json.dumps(track, ensure_ascii=False) + '\n' for track in self._new_tracks).encode('utf-8')
+        with open(os.path.join(self.path, 'tracks.jsonl'), 'ab') as f:
+            f.write(data)
+        self._tracks_offset += len(data)
+        self._new_tracks = []